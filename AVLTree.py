@@ -1,8 +1,20 @@
 """A class representing a node in an AVL tree"""
 
+from bisect import bisect_left
+from collections import OrderedDict
+import mmap
+import math
+import operator
+import pickle
+import struct
+import time
+
 
 class AVLNode(object):
+	__slots__ = ('key', 'value', 'parent', 'left', 'right', 'height', 'size')
+
 	"""Constructor, you are allowed to add more fields.
+	real nodes share the VIRTUAL sentinel as their missing sons
 
 	@type key: int or None
 	@param key: key of your node
@@ -20,8 +32,8 @@ class AVLNode(object):
 			self.size = 0
 
 		else:  # node is leaf
-			self.left = AVLNode(None, None, self)
-			self.right = AVLNode(None, None, self)
+			self.left = VIRTUAL
+			self.right = VIRTUAL
 			self.height = 0
 			self.size = 1
 
@@ -135,9 +147,9 @@ class AVLNode(object):
 		else:
 			par = self
 		if left:
-			par.set_left(AVLNode(None, None, par))
+			par.set_left(VIRTUAL)
 		else:
-			par.set_right(AVLNode(None, None, par))
+			par.set_right(VIRTUAL)
 		return None
 
 	"""sets parent
@@ -194,6 +206,22 @@ class AVLNode(object):
 				return True
 		return False
 
+	"""makes self a new lone leaf (key, value), for reuse by a NodePool"""
+	def reset(self, key, value):
+		self.key, self.value, self.parent = key, value, None
+		self.left = self.right = VIRTUAL
+		self.height, self.size = 0, 1
+		return None
+
+	"""forgets self's old links, making self a lone leaf again
+	@pre: self was already removed from its tree (deleted, or taken by split)"""
+	def clear_links(self):
+		self.set_left(VIRTUAL)
+		self.set_right(VIRTUAL)
+		self.set_parent(None)
+		self.update_node()
+		return None
+
 	"""returns whether self is not a virtual node 
 
 	@rtype: bool
@@ -217,18 +245,16 @@ class AVLNode(object):
 			return y
 		return self.get_right().go_to_h(-1, True)  # finds sub-tree's minimum
 
-	"""
-	* * * for FT-insert * * *
-	returns the node's predecessor in the tree
-	"""
+	"""returns the node's predecessor in the tree"""
 	def get_predecessor(self):
-		x = self
-		if x.get_left().is_real_node():  # node has left son
-			x = x.get_left()
-			return x.go_to_h(-1, False)  # return max of node's left tree
-		if x.get_parent() is not None:  # node's left tree is empty
-			return x.get_parent()
-		return None  # node is the only node in the tree
+		if not self.get_left().is_real_node():  # node's left tree is empty
+			x = self
+			y = self.get_parent()
+			while y is not None and x == y.get_left():
+				x = y
+				y = x.get_parent()
+			return y
+		return self.get_left().go_to_h(-1, False)  # finds sub-tree's maximum
 
 	"""finds a node with height h in the node's leftmost or rightmost subtree, or minimal if h == -1
 	@type h: int
@@ -248,6 +274,423 @@ class AVLNode(object):
 		return x
 
 
+"""
+The single virtual node shared by every tree as the son of its leaves.
+it has no parent, so it can't be used to climb back into a tree
+"""
+
+
+class _VirtualNode(AVLNode):
+	__slots__ = ()
+
+	def __init__(self):
+		for name in AVLNode.__slots__:
+			object.__setattr__(self, name, None)
+		object.__setattr__(self, 'height', -1)
+		object.__setattr__(self, 'size', 0)
+
+	"""the sentinel is shared - any change to it would corrupt all trees"""
+	def __setattr__(self, name, value):
+		raise AttributeError("the virtual node is immutable")
+
+	def __reduce__(self):
+		return 'VIRTUAL'
+
+	def __copy__(self):
+		return self
+
+	def __deepcopy__(self, memo):
+		return self
+
+
+VIRTUAL = _VirtualNode()
+
+
+"""
+the dump file: a header, then one record per node in pre-order, then the pickled list of the
+nodes' values (in the same order). records keep height & size so load needs no recomputation
+"""
+DUMP_MAGIC = b'AVLT'
+DUMP_VERSION = 1
+DUMP_HEADER = struct.Struct('<4sHHQQ')  # magic, version, reserved, number of nodes, values offset
+DUMP_RECORD = struct.Struct('<qqbB')  # key, size, height, sons (1 - has left, 2 - has right)
+
+
+"""
+An associative aggregate over the values of a tree, kept per subtree by AugmentedAVLNode.
+combine must be associative with identity as its neutral element. the aggregate of a
+subtree is combine(left's, lift(node's value), right's), in order of keys
+"""
+
+
+class Monoid(object):
+	__slots__ = ('combine', 'identity', 'lift')
+
+	"""
+	@type combine: function
+	@param combine: combine(a, b), associative
+	@param identity: combine(identity, a) == combine(a, identity) == a
+	@type lift: function
+	@param lift: maps a node's value to its aggregate, the value itself if None
+	"""
+	def __init__(self, combine, identity, lift=None):
+		self.combine = combine
+		self.identity = identity
+		self.lift = lift if lift is not None else (lambda value: value)
+
+
+"""counts the values v for which pred(v) is true"""
+def count_if(pred):
+	return Monoid(operator.add, 0, lambda value: 1 if pred(value) else 0)
+
+
+SUM = Monoid(operator.add, 0)
+MIN = Monoid(min, float('inf'))
+MAX = Monoid(max, float('-inf'))
+COUNT = Monoid(operator.add, 0, lambda value: 1)
+
+
+"""sorts (key, value) pairs by key, the last value of a repeated key wins.
+a module function, so it can run in an executor's thread or worker process"""
+def sort_items(pairs):
+	return sorted(dict(pairs).items(), key=lambda item: item[0])
+
+
+"""
+A node that also keeps, for every monoid of its tree, the aggregate of its subtree.
+it is refreshed by update_node, so rotations, joins and splits keep it correct
+"""
+
+
+class AugmentedAVLNode(AVLNode):
+	__slots__ = ('agg', 'monoids')
+
+	"""
+	@type monoids: tuple
+	@param monoids: the Monoids of the tree, shared by all its nodes
+	"""
+	def __init__(self, key=None, value=None, parent=None, monoids=()):
+		self.monoids = monoids
+		AVLNode.__init__(self, key, value, parent)
+		self.update_agg()
+
+	"""recomputes the aggregates of self's subtree from its sons'"""
+	def update_agg(self):
+		left, right = self.get_left(), self.get_right()
+		self.agg = tuple(m.combine(m.combine(left.agg[i] if left.is_real_node() else m.identity,
+									m.lift(self.value)),
+									right.agg[i] if right.is_real_node() else m.identity)
+						for i, m in enumerate(self.monoids))
+		return None
+
+	"""updates size, height & aggregates, see AVLNode.update_node"""
+	def update_node(self, size=True, height=True):
+		changed = AVLNode.update_node(self, size, height)
+		self.update_agg()
+		return changed
+
+	"""makes self a new lone leaf, see AVLNode.reset"""
+	def reset(self, key, value):
+		AVLNode.reset(self, key, value)
+		self.update_agg()
+		return None
+
+	"""sets value and refreshes the aggregates on the path to the root"""
+	def set_value(self, value):
+		self.value = value
+		x = self
+		while x is not None:
+			x.update_agg()
+			x = x.get_parent()
+		return None
+
+
+"""
+Cumulative counters of what trees are doing, see AVLTree.enable_stats.
+one TreeStats may be shared by many trees (the trees split from a tree share its stats).
+histograms are log2-bucketed: bucket b counts the values v with v.bit_length() == b,
+i.e. 2**(b-1) <= v < 2**b (bucket 0 counts zeros)
+"""
+
+
+class TreeStats(object):
+
+	"""the public operations whose latency is recorded"""
+	TIMED = ('search', 'insert', 'FT_insert', 'finger_insert', 'delete', 'split', 'split_key', 'join',
+			'rank', 'select', 'insert_many', 'delete_many', 'avl_to_array')
+
+	def __init__(self):
+		self.reset()
+
+	"""zeroes all counters"""
+	def reset(self):
+		self.single_rotations = 0
+		self.double_rotations = 0
+		self.allocations = 0
+		self.search_paths = {}  # nodes visited by search_closest
+		self.update_walks = {}  # nodes walked by update
+		self.height_changes = {}  # heights changed per update
+		self.fix_counts = {}  # rebalancing operations per fix_after
+		self.latencies = {}  # operation -> histogram of nanoseconds
+		return None
+
+	"""adds value to a log2-bucketed histogram"""
+	@staticmethod
+	def record(hist, value):
+		b = value.bit_length()
+		hist[b] = hist.get(b, 0) + 1
+		return None
+
+	"""returns a plain-dict copy of the counters, for export to a metrics system.
+	histograms map the upper bound 2**b of each bucket to its count
+
+	@rtype: dict
+	"""
+	def snapshot(self):
+		def hist(h):
+			return {1 << b: c for b, c in sorted(h.items())}
+		return {
+			'rotations': {'single': self.single_rotations, 'double': self.double_rotations},
+			'allocations': self.allocations,
+			'search_path': hist(self.search_paths),
+			'update_walk': hist(self.update_walks),
+			'height_changes': hist(self.height_changes),
+			'fix_after': hist(self.fix_counts),
+			'latency_ns': {op: hist(h) for op, h in sorted(self.latencies.items()) if h},
+		}
+
+	"""returns the number of nodes from x up to the root"""
+	@staticmethod
+	def depth(x):
+		d = 0
+		while x is not None:
+			d += 1
+			x = x.get_parent()
+		return d
+
+	"""returns instrumented versions of tree's methods, {name: function}"""
+	def wrappers(self, tree):
+		record, depth = self.record, self.depth
+		make_node, search_closest, update = tree.make_node, tree.search_closest, tree.update
+		fix_after, rotate = tree.fix_after, tree.rotate
+
+		def counted_make_node(key, val):
+			self.allocations += 1
+			return make_node(key, val)
+
+		def counted_search_closest(key):
+			x = search_closest(key)
+			record(self.search_paths, depth(x))
+			return x
+
+		def counted_update(node, operation=None):
+			cnt = update(node, operation)
+			record(self.update_walks, depth(node))
+			record(self.height_changes, cnt)
+			return cnt
+
+		def counted_fix_after(y, insert=True):
+			cnt = fix_after(y, insert)
+			record(self.fix_counts, cnt)
+			return cnt
+
+		def counted_rotate(node):
+			cnt = rotate(node)
+			if cnt == 1:
+				self.single_rotations += 1
+			else:
+				self.double_rotations += 1
+			return cnt
+
+		def timed(op):
+			method = getattr(tree, op)
+			hist = self.latencies.setdefault(op, {})
+
+			def timed_op(*args, **kwargs):
+				start = time.perf_counter_ns()
+				try:
+					return method(*args, **kwargs)
+				finally:
+					record(hist, time.perf_counter_ns() - start)
+			return timed_op
+
+		res = {'make_node': counted_make_node, 'search_closest': counted_search_closest,
+				'update': counted_update, 'fix_after': counted_fix_after, 'rotate': counted_rotate}
+		res.update((op, timed(op)) for op in self.TIMED)
+		return res
+
+
+"""
+A lookup accelerator for a tree, see AVLTree.enable_fingers: a bounded LRU of recently found
+nodes by key, and a finger - the last accessed node - from which a missed key is searched
+(see AVLTree.finger_closest), so repeated keys are found in O(1) and nearby keys in O(log d).
+the tree drops a node from its cache when it deletes it, and clears the cache when split,
+join or a batch operation move its nodes
+"""
+
+
+class FingerCache(object):
+
+	"""
+	@type capacity: int
+	@param capacity: the number of nodes kept in the LRU, 0 to keep only the finger
+	"""
+	def __init__(self, capacity=1024):
+		self.capacity = capacity
+		self.nodes = OrderedDict()
+		self.finger = None
+		self.lookups = 0
+		self.hits = 0  # found in the LRU
+		self.finger_hits = 0  # found from the finger
+		self.misses = 0  # not in the tree
+		self.steps = 0  # nodes visited by finger searches
+
+	"""searches tree (whose cache self is) for key
+
+	@rtype: AVLNode
+	@returns: node corresponding to key, None if key is not in tree
+	"""
+	def search(self, tree, key):
+		self.lookups += 1
+		x = self.nodes.get(key)
+		if x is not None:
+			self.hits += 1
+			self.nodes.move_to_end(key)
+			self.finger = x
+			return x
+		x, cnt = tree.finger_closest(key, self.finger)
+		self.steps += cnt
+		self.finger = x
+		if x is None or x.get_key() != key:
+			self.misses += 1
+			return None
+		self.finger_hits += 1
+		if self.capacity > 0:
+			self.nodes[key] = x
+			if len(self.nodes) > self.capacity:
+				self.nodes.popitem(last=False)
+		return x
+
+	"""forgets node, which is leaving the tree"""
+	def discard(self, node):
+		if self.nodes.get(node.get_key()) is node:
+			del self.nodes[node.get_key()]
+		if self.finger is node:
+			self.finger = node.get_parent()
+		return None
+
+	"""forgets all nodes"""
+	def clear(self):
+		self.nodes.clear()
+		self.finger = None
+		return None
+
+	"""returns the counters as a dict, hit_rate is the part of the lookups found in the LRU
+
+	@rtype: dict
+	"""
+	def snapshot(self):
+		finger_searches = self.lookups - self.hits
+		return {'capacity': self.capacity, 'size': len(self.nodes), 'lookups': self.lookups,
+				'hits': self.hits, 'finger_hits': self.finger_hits, 'misses': self.misses,
+				'hit_rate': self.hits / self.lookups if self.lookups else 0.0,
+				'steps_per_finger_search': self.steps / finger_searches if finger_searches else 0.0}
+
+
+"""
+A free list of nodes removed from trees, see AVLTree.enable_pool. make_node takes its nodes
+from the pool while it has any, and delete, split & the batch deletions give the nodes they
+remove back to it, so a tree with as many inserts as deletes stops allocating nodes.
+a pool may be shared by trees of the same node type (the trees split from a tree share its pool)
+"""
+
+
+class NodePool(object):
+
+	"""
+	@type cap: int
+	@param cap: the most nodes kept, nodes released to a full pool are left to the GC
+	"""
+	def __init__(self, cap=1024):
+		self.cap = cap
+		self.nodes = []
+		self.reused = 0
+		self.released = 0
+		self.dropped = 0
+
+	"""returns a recycled lone leaf (key, val), None if the pool is empty"""
+	def take(self, key, val):
+		if not self.nodes:
+			return None
+		x = self.nodes.pop()
+		x.reset(key, val)
+		self.reused += 1
+		return x
+
+	"""takes a node that was removed from its tree. its links & value are dropped at once,
+	so the pool doesn't keep them alive"""
+	def release(self, node):
+		self.released += 1
+		if len(self.nodes) >= self.cap:
+			self.dropped += 1
+			return None
+		node.key = node.value = node.parent = None
+		node.left = node.right = VIRTUAL
+		self.nodes.append(node)
+		return None
+
+	"""returns the counters as a dict
+
+	@rtype: dict
+	"""
+	def snapshot(self):
+		return {'cap': self.cap, 'size': len(self.nodes), 'reused': self.reused,
+				'released': self.released, 'dropped': self.dropped}
+
+
+"""
+A read position in a sorted stream of (key, value) items, e.g. another tree's items(), so set
+operations can merge a tree in order without listing it (see AVLTree.merge_walk)
+"""
+
+
+class ItemCursor(object):
+	__slots__ = ('items', 'key', 'value', 'done')
+
+	def __init__(self, items):
+		self.items = iter(items)
+		self.key = self.value = None
+		self.done = False
+		self.advance()
+
+	"""moves to the next item"""
+	def advance(self):
+		item = next(self.items, None)
+		if item is None:
+			self.done = True
+		else:
+			self.key, self.value = item
+		return None
+
+	"""returns whether the current item's key is < hi (hi None for no bound)"""
+	def before(self, hi):
+		return not self.done and (hi is None or self.key < hi)
+
+	"""returns the items from the current one up to (not including) the first key >= hi"""
+	def take(self, hi):
+		items = []
+		while self.before(hi):
+			items.append((self.key, self.value))
+			self.advance()
+		return items
+
+	"""skips the items up to (not including) the first key >= hi"""
+	def skip(self, hi):
+		while self.before(hi):
+			self.advance()
+		return None
+
+
 """
 A class implementing an AVL tree.
 """
@@ -258,16 +701,117 @@ class AVLTree(object):
 	"""
 	Constructor, you are allowed to add more fields.
 
+	@type aggregates: dict
+	@param aggregates: name -> Monoid, aggregates over values to keep for range queries (see aggregate)
 	"""
-	def __init__(self, node=None):
+	def __init__(self, node=None, aggregates=None):
 		self.root = node
 		self.Tmin = node
-		# self.Tmax = node   #for FT-insert
+		self.Tmax = node
+		self.aggregates = aggregates
+		self.monoids = tuple(aggregates.values()) if aggregates else None
+		self.stats = None
+		self.instrumented = ()  # the names of the methods enable_stats shadows on self
+		self.fingers = None
+		self.pool = None
+
+	"""creates a lone node for self - an AugmentedAVLNode if self keeps aggregates"""
+	def make_node(self, key, val):
+		if self.pool is not None:
+			x = self.pool.take(key, val)
+			if x is not None:
+				return x
+		if self.monoids is None:
+			return AVLNode(key, val)
+		return AugmentedAVLNode(key, val, None, self.monoids)
+
+	"""returns a new tree rooted at node, with self's settings"""
+	def spawn(self, node=None):
+		tree = self.like(node)
+		if self.stats is not None:
+			tree.enable_stats(self.stats)
+		if self.fingers is not None:
+			tree.enable_fingers(self.fingers.capacity)
+		tree.pool = self.pool
+		return tree
+
+	"""starts caching lookups: search first looks key up in an LRU of recently found nodes, then
+	searches from the last accessed node instead of the root (see FingerCache)
+
+	@type capacity: int
+	@param capacity: the number of nodes kept in the LRU
+	@rtype: FingerCache
+	@returns: the cache, whose snapshot gives its hit rate
+	"""
+	def enable_fingers(self, capacity=1024):
+		self.fingers = FingerCache(capacity)
+		return self.fingers
+
+	"""stops caching lookups, returns the cache (None if there was none)"""
+	def disable_fingers(self):
+		fingers, self.fingers = self.fingers, None
+		return fingers
+
+	"""starts recycling nodes: removed nodes go to a NodePool, from which new nodes are taken.
+	a node must not be used after it is deleted (or split at) - it may already hold another key
+
+	@type cap: int
+	@param cap: the most nodes the pool keeps
+	@type pool: NodePool
+	@param pool: a pool to share, a new one if None
+	@rtype: NodePool
+	@returns: the pool
+	"""
+	def enable_pool(self, cap=1024, pool=None):
+		self.pool = pool if pool is not None else NodePool(cap)
+		return self.pool
+
+	"""stops recycling nodes, returns the pool (None if there was none)"""
+	def disable_pool(self):
+		pool, self.pool = self.pool, None
+		return pool
+
+	"""returns a new tree rooted at node of self's kind - a subclass with settings of its own
+	overrides it, and spawn adds the settings of AVLTree"""
+	def like(self, node=None):
+		return AVLTree(node, self.aggregates)
+
+	"""starts collecting stats: rotations, search path lengths, update walks, node allocations
+	and operation latencies (see TreeStats). the instrumented methods shadow the class's only on
+	self, so trees without stats run the plain methods at no cost
+
+	@type stats: TreeStats
+	@param stats: the collector to add to, a new one if None
+	@rtype: TreeStats
+	@returns: the collector
+	"""
+	def enable_stats(self, stats=None):
+		self.disable_stats()
+		self.stats = stats if stats is not None else TreeStats()
+		wrappers = self.stats.wrappers(self)
+		self.__dict__.update(wrappers)
+		self.instrumented = tuple(wrappers)
+		return self.stats
+
+	"""stops collecting stats, returns the collector (None if there was none)"""
+	def disable_stats(self):
+		stats, self.stats = self.stats, None
+		for name in self.instrumented:
+			del self.__dict__[name]
+		self.instrumented = ()
+		return stats
+
+	"""the instrumented methods are closures - they are dropped on pickling, and so are the stats"""
+	def __getstate__(self):
+		state = {name: val for name, val in self.__dict__.items() if name not in self.instrumented}
+		state['stats'] = None
+		state['instrumented'] = ()
+		return state
 
 	"""changes tree's root to be @param new_root"""
 	def set_root(self, new_root):
 		if self.root is None or new_root is None:
-			# self.Tmax = new_root   #for FT-insert
+			self.Tmax = new_root
 			self.Tmin = new_root
 		self.root = new_root
 
@@ -287,18 +831,13 @@ class AVLTree(object):
 	def get_min(self):
 		return self.Tmin
 
-	"""
-	* * * for FT-insert * * *
-	sets the tree's maximum
-	"""
-	# def set_max(self, node):
-	# 	self.Tmax = node
+	"""sets the tree's maximum"""
+	def set_max(self, node):
+		self.Tmax = node
 
-	"""
-	* * * for FT-insert * * *
-	sets the tree's minimum"""
-	# def get_max(self):
-	# 	return self.Tmax
+	"""returns the tree's maximum"""
+	def get_max(self):
+		return self.Tmax
 
 	"""updates self's Tmin&Tmax according to the node inserted/deleted
 	fit for insertion if insert == True, for deletion if insert == False
@@ -308,27 +847,27 @@ class AVLTree(object):
 		if insert:
 			if self.get_min() is None:
 				self.set_min(node)
-			# if self.get_max() is None:    #for FT-insert
-				# self.set_max(node)    #for FT-insert
+			if self.get_max() is None:
+				self.set_max(node)
 
 			if node.get_key() < self.get_min().get_key():
 				self.set_min(node)
-			# if node.get_key() > self.get_max().get_key():   #for FT-insert
-				# self.set_max(node)   #for FT-insert
+			if node.get_key() > self.get_max().get_key():
+				self.set_max(node)
 
 		elif insert == False:
 			if self.get_min() == node:
 				self.set_min(node.get_successor())
-			# if self.get_max() == node:   #for FT-insert
-				# self.set_max(node.get_predecessor())   #for FT-insert
+			if self.get_max() == node:
+				self.set_max(node.get_predecessor())
 
 		elif self.get_root() is None:
 			self.set_min(None)
-			# self.set_max(None)   #for FT-insert
+			self.set_max(None)
 
 		else:
 			self.set_min(self.get_root().go_to_h(-1, True))
-			# self.set_max(self.get_root().go_to_h(-1, False))  #for FT-insert
+			self.set_max(self.get_root().go_to_h(-1, False))
 
 		return self
 
@@ -356,6 +895,8 @@ class AVLTree(object):
 	@returns: node corresponding to key.
 	"""
 	def search(self, key):
+		if self.fingers is not None:
+			return self.fingers.search(self, key)
 		x = self.search_closest(key)
 		if x is None:
 			return None  # tree is empty
@@ -366,21 +907,221 @@ class AVLTree(object):
 	@type key: int
 	@param key: a key to be searched
 	@rtype: AVLNode
-	@returns: node corresponding to key
+	@returns: node corresponding to key, or the last real node on the search path
 	"""
 
 	def search_closest(self, key):
 		if self.get_root() is None:  # empty tree
 			return None
 		x = self.root
+		y = None  # virtual sons are shared, so remember their parent
 		while x.is_real_node():
 			if key == x.get_key():
 				return x
-			elif key < x.get_key():
+			y = x
+			if key < x.get_key():
 				x = x.get_left()
 			else:
 				x = x.get_right()
-		return x.get_parent()
+		return y
+
+	"""looks many keys up in one merged traversal: the batch is sorted and pushed down the tree
+	once (as in insert_many), so its keys share their search paths. O(k*log(n/k + 1)) for k keys
+
+	@type keys: list
+	@param keys: the keys to look up, in any order, or a NumPy array of keys
+	@param default: the value of keys not in self. for a NumPy batch with a dtype other than
+	object, None stands for the dtype's zero (the found mask tells the missing keys apart)
+	@param dtype: for a NumPy batch, the dtype of the values array
+	@rtype: list
+	@returns: the values of keys, in keys' order. for a NumPy batch, a pair (found, values) of
+	arrays - a bool mask of the keys in self and their values
+	"""
+	def search_many(self, keys, default=None, dtype=object):
+		numpy_keys = hasattr(keys, 'dtype') and hasattr(keys, 'argsort')
+		if numpy_keys:
+			order = keys.argsort(kind='stable')
+			skeys = keys[order].tolist()
+			order = order.tolist()
+		else:
+			order = sorted(range(len(keys)), key=keys.__getitem__)
+			skeys = [keys[j] for j in order]
+		found = [False] * len(skeys)
+		res = [default] * len(skeys)
+		if self.root is not None:
+			self.search_batch(self.root, skeys, 0, len(skeys), order, found, res)
+		if not numpy_keys:
+			return res
+		import numpy
+		mask = numpy.array(found, dtype=bool)
+		if dtype is object:  # fill one by one, so tuple values don't become rows
+			values = numpy.empty(len(res), dtype=object)
+			for j, val in enumerate(res):
+				values[j] = val
+		else:  # None doesn't fit a numeric dtype, so only the found values are converted
+			values = numpy.zeros(len(res), dtype=dtype)
+			if default is not None:
+				values[:] = default
+			values[mask] = [val for val, ok in zip(res, found) if ok]
+		return mask, values
+
+	"""finds keys[lo:hi] (sorted) in the subtree of x, the same way as insert_batch.
+	the value of keys[i] goes to res[order[i]] and found[order[i]] is set"""
+	def search_batch(self, x: AVLNode, keys, lo, hi, order, found, res):
+		while lo < hi and x.is_real_node():
+			key = x.get_key()
+			i = j = bisect_left(keys, key, lo, hi)
+			while j < hi and keys[j] == key:  # a key may repeat in the batch
+				found[order[j]] = True
+				res[order[j]] = x.get_value()
+				j += 1
+			if i - lo < hi - j:  # recurse into the smaller side, loop on the larger one
+				self.search_batch(x.get_left(), keys, lo, i, order, found, res)
+				x, lo = x.get_right(), j
+			else:
+				self.search_batch(x.get_right(), keys, j, hi, order, found, res)
+				x, hi = x.get_left(), i
+		return None
+
+	"""builds a perfectly balanced tree bottom-up in O(n), without any rotations
+
+	@type items: iterable
+	@pre: items are (key, value) pairs with strictly increasing keys
+	@param items: the items of the new dictionary
+	@type aggregates: dict
+	@param aggregates: as in the constructor
+	@rtype: AVLTree
+	@returns: a new tree holding items
+	"""
+	@classmethod
+	def from_sorted(cls, items, aggregates=None):
+		items = items if isinstance(items, list) else list(items)
+		for i in range(1, len(items)):
+			if not items[i-1][0] < items[i][0]:
+				raise ValueError("keys are not strictly increasing at %r" % (items[i][0],))
+		tree = cls(None, aggregates)
+		if items:
+			tree.set_root(tree.build_sorted(items))
+		return tree.update_min()
+
+	"""builds a balanced subtree of self's nodes from items sorted by key, see from_sorted
+
+	@rtype: AVLNode
+	@returns: the subtree's root, VIRTUAL if items is empty
+	"""
+	def build_sorted(self, items):
+		def build(lo, hi):  # balanced subtree of items[lo:hi], virtual if empty
+			if lo >= hi:
+				return VIRTUAL
+			mid = (lo + hi) // 2
+			x = self.make_node(items[mid][0], items[mid][1])
+			for son in (build(lo, mid), build(mid + 1, hi)):
+				if son.is_real_node():
+					son.set_parent(x)
+			x.update_node()
+			return x
+
+		return build(0, len(items))
+
+	"""builds a balanced tree from unsorted (key, value) pairs in O(n log n)
+
+	@type items: iterable
+	@param items: the items of the new dictionary
+	@type merge: function
+	@param merge: merge(old_val, new_val) gives the value kept for a repeated key,
+	if None a repeated key raises ValueError
+	@type aggregates: dict
+	@param aggregates: as in the constructor
+	@rtype: AVLTree
+	@returns: a new tree holding items
+	"""
+	@classmethod
+	def from_iterable(cls, items, merge=None, aggregates=None):
+		lst = []
+		for key, val in sorted(items, key=lambda item: item[0]):  # stable - repeats keep their order
+			if lst and lst[-1][0] == key:
+				if merge is None:
+					raise ValueError("repeated key %r" % (key,))
+				lst[-1] = (key, merge(lst[-1][1], val))
+			else:
+				lst.append((key, val))
+		return cls.from_sorted(lst, aggregates)
+
+	"""writes the dictionary to a file, in a compact versioned binary format, see load
+
+	@type path: str
+	@param path: the file to write
+	@pre: keys are ints that fit in 64 bits, values can be pickled
+	"""
+	def dump(self, path):
+		n = self.size()
+		records = bytearray(n * DUMP_RECORD.size)
+		values = []
+		stack = [self.root] if self.root is not None else []
+		off = 0
+		while stack:  # pre-order
+			x = stack.pop()
+			left, right = x.get_left(), x.get_right()
+			sons = (1 if left.is_real_node() else 0) | (2 if right.is_real_node() else 0)
+			try:
+				DUMP_RECORD.pack_into(records, off, x.get_key(), x.get_size(), x.get_height(), sons)
+			except struct.error:
+				raise ValueError("can't dump key %r, keys must be 64 bit ints" % (x.get_key(),))
+			off += DUMP_RECORD.size
+			values.append(x.get_value())
+			if right.is_real_node():
+				stack.append(right)
+			if left.is_real_node():
+				stack.append(left)
+		with open(path, 'wb') as f:
+			f.write(DUMP_HEADER.pack(DUMP_MAGIC, DUMP_VERSION, 0, n, DUMP_HEADER.size + len(records)))
+			f.write(records)
+			pickle.dump(values, f, pickle.HIGHEST_PROTOCOL)
+
+	"""reads a dictionary written by dump. the file is memory-mapped and the tree is
+	rebuilt in its dumped shape in O(n), without any rotation or height/size recomputation
+
+	@type path: str
+	@param path: the file to read
+	@type aggregates: dict
+	@param aggregates: as in the constructor
+	@rtype: AVLTree
+	@returns: a new tree holding the dumped items
+	"""
+	@classmethod
+	def load(cls, path, aggregates=None):
+		tree = cls(None, aggregates)
+		with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+			magic, version, reserved, n, values_off = DUMP_HEADER.unpack_from(mm, 0)
+			if magic != DUMP_MAGIC:
+				raise ValueError("%s is not an AVLTree dump" % (path,))
+			if version > DUMP_VERSION:
+				raise ValueError("%s has dump version %d, newer than %d" % (path, version, DUMP_VERSION))
+			values = pickle.loads(mm[values_off:])
+			nodes = []
+			pending_right = []  # nodes whose right son wasn't read yet
+			want_left = None  # the last node, if its left son is next
+			off = DUMP_HEADER.size
+			for i in range(n):
+				key, size, height, sons = DUMP_RECORD.unpack_from(mm, off)
+				off += DUMP_RECORD.size
+				x = tree.make_node(key, values[i])
+				x.size, x.height = size, height
+				if want_left is not None:
+					want_left.left, x.parent = x, want_left
+				elif nodes:
+					par = pending_right.pop()
+					par.right, x.parent = x, par
+				nodes.append(x)
+				if sons & 2:
+					pending_right.append(x)
+				want_left = x if sons & 1 else None
+		if tree.monoids is not None:
+			for x in reversed(nodes):  # sons come after their parent in pre-order
+				x.update_agg()
+		if nodes:
+			tree.set_root(nodes[0])
+		return tree.update_min()
 
 	"""inserts val at position i in the dictionary
 
@@ -391,60 +1132,311 @@ class AVLTree(object):
 	@param val: the value of the item
 	@rtype: int
 	@returns: the number of rebalancing operation due to AVL rebalancing
+	@raises KeyError: if key is already in the dictionary (see upsert)
 	"""
 	def insert(self, key, val):
-		y = AVLNode(key, val)
-		if self.get_root() is None:
-			self.set_root(y)
-			self.set_min(y)
-			return 0
 		x = self.search_closest(key)
+		if x is not None and x.get_key() == key:
+			raise KeyError("key %r is already in the tree" % (key,))
+		return self.insert_under(x, key, val)[1]
+
+	"""hangs a new node (key, val) under x, the node search_closest(key) returned, and rebalances
+
+	@rtype: (AVLNode, int)
+	@returns: the new node and the number of rebalancing operations
+	"""
+	def insert_under(self, x: AVLNode, key, val):
+		y = self.make_node(key, val)
+		if x is None:  # empty tree
+			self.set_root(y)
+			return y, 0
 		y.set_parent(x)
 		self.update_min(y, True)
-		return self.fix_after(x)
+		return y, self.fix_after(x)
+
+	"""sets key's value, inserting key if it is not in the dictionary - in one descent
 
+	@rtype: int
+	@returns: the number of rebalancing operations, 0 if key was already in the dictionary
 	"""
-	* * * * * * * * * * * * * * * * * * * * * * * * * * * 
-	* * * * * * * * finger-Tree insertion * * * * * * * *
-	* * * * un# relevant lines/methods before use * * * *
-	* * * can be found by searching 'for FT-insert' * * *
-	* * * * * * * * * * * * * * * * * * * * * * * * * * *
-	
-	performs insert using finger-tree technic:
+	def upsert(self, key, val):
+		x = self.search_closest(key)
+		if x is not None and x.get_key() == key:
+			x.set_value(val)
+			return 0
+		return self.insert_under(x, key, val)[1]
+
+	"""returns key's node, inserting key with the value factory() first if it is not in the
+	dictionary - in one descent
+
+	@type factory: function
+	@param factory: makes the value of a new key, called only if key is missing
+	@rtype: AVLNode
+	@returns: the node of key
+	"""
+	def get_or_insert(self, key, factory):
+		x = self.search_closest(key)
+		if x is not None and x.get_key() == key:
+			return x
+		return self.insert_under(x, key, factory())[0]
+
+	"""deletes key from the dictionary - in one descent (no node needed, see delete)
+
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	@raises KeyError: if key is not in the dictionary
+	"""
+	def delete_key(self, key):
+		x = self.search(key)
+		if x is None:
+			raise KeyError(key)
+		return self.delete(x)
+
+	"""deletes key from the dictionary and returns its value - in one descent
+
+	@param default: returned if key is not in the dictionary
+	@returns: key's value, default if key is missing
+	@raises KeyError: if key is missing and no default was given
+	"""
+	def pop(self, key, *default):
+		x = self.search(key)
+		if x is None:
+			if default:
+				return default[0]
+			raise KeyError(key)
+		val = x.get_value()
+		self.delete(x)
+		return val
+
+	"""returns the item of the minimal key in O(1), None if the dictionary is empty
+
+	@rtype: tuple
+	@returns: (key, value)
+	"""
+	def peek_min(self):
+		x = self.get_min()
+		return None if x is None else (x.get_key(), x.get_value())
+
+	"""returns the item of the maximal key in O(1), None if the dictionary is empty
+
+	@rtype: tuple
+	@returns: (key, value)
+	"""
+	def peek_max(self):
+		x = self.get_max()
+		return None if x is None else (x.get_key(), x.get_value())
+
+	"""removes x, the tree's minimum (left == True) or maximum, without delete's general path:
+	x has at most one son, which takes its place, and the new end is that son's end or x's parent.
+	the climb to the root rebalances only while heights change - after that only the sizes
+	(and aggregates) change, once per node - instead of delete's full update walk and the
+	separate rebalancing walk of fix_after
+
+	@rtype: int
+	@returns: the number of rotations
+	"""
+	def remove_end(self, x: AVLNode, left=True):
+		if self.fingers is not None:
+			self.fingers.discard(x)
+		par = x.get_parent()
+		son = x.get_right() if left else x.get_left()
+		end = son.go_to_h(-1, left) if son.is_real_node() else par
+		if son.is_real_node():
+			if son.set_parent(par):
+				self.set_root(son)
+		elif x.virtual_son():  # x was the only node
+			self.set_root(None)
+		if left:
+			self.set_min(end)
+		else:
+			self.set_max(end)
+		cnt = 0
+		balancing = True
+		y = par
+		while y is not None:
+			if balancing or self.monoids is not None:
+				h = y.get_height()
+				y.update_node()
+				if abs(y.getBF()) == 2:
+					cnt += self.rotate(y)
+					y = y.get_parent()  # the rotated subtree's new root
+				balancing = balancing and y.get_height() != h
+			else:
+				y.add_to_size(-1)
+			y = y.get_parent()
+		if self.pool is not None:
+			self.pool.release(x)
+		return cnt
+
+	"""deletes the minimal key and returns its item. the minimum has no left son, so it is
+	spliced out by remove_end, cheaper than delete(get_min())
+
+	@rtype: tuple
+	@returns: (key, value)
+	@raises KeyError: if the dictionary is empty
+	"""
+	def pop_min(self):
+		x = self.get_min()
+		if x is None:
+			raise KeyError("pop_min from an empty tree")
+		item = x.get_key(), x.get_value()
+		self.remove_end(x, True)
+		return item
+
+	"""deletes the maximal key and returns its item, see pop_min
+
+	@rtype: tuple
+	@returns: (key, value)
+	@raises KeyError: if the dictionary is empty
+	"""
+	def pop_max(self):
+		x = self.get_max()
+		if x is None:
+			raise KeyError("pop_max from an empty tree")
+		item = x.get_key(), x.get_value()
+		self.remove_end(x, False)
+		return item
+
+	"""deletes the k minimal keys with one select & split, O(log n + k) instead of k pop_min
+
+	@type k: int
+	@param k: the number of items to remove, all of them if k >= self.size()
+	@rtype: list
+	@returns: the removed items, a sorted list of (key, value) tuples
+	"""
+	def pop_min_n(self, k):
+		if k <= 0 or self.get_root() is None:
+			return []
+		if k >= self.size():
+			lst = self.avl_to_array()
+			self.set_batch_root(VIRTUAL)
+			return lst
+		x = self.select(k)
+		item = x.get_key(), x.get_value()
+		left, right = self.split(x)
+		lst = left.avl_to_array()
+		lst.append(item)
+		self.adopt(right)
+		return lst
+
+	"""searches for key starting from a finger - a node of self, by default the tree's minimum or
+	maximum, whichever side of the root key is on: climbs from the finger to the first node whose
+	subtree must hold key, then goes down as search_closest. O(log d) for a key d positions away
+	from an end of the tree, and usually for a key d positions away from the finger.
+	a node's keys are bounded by its lowest ancestors that hold it in their left / right subtree,
+	so the climb stops at a node that is the left (right) son of a parent with a larger (smaller) key
+
+	@type key: int
+	@param key: a key to be searched
+	@type finger: AVLNode
+	@param finger: the node to start from, None for the closer end of the tree
+	@rtype: (AVLNode, int)
+	@returns: the node search_closest would return, and the number of nodes visited on the way
+	"""
+	def finger_closest(self, key, finger=None):
+		if self.get_root() is None:
+			return None, 0
+		cnt = 0
+		if key <= self.get_min().get_key():  # key is at an end, no need to climb
+			finger = self.get_min()
+		elif key >= self.get_max().get_key():
+			finger = self.get_max()
+		elif finger is None:
+			finger = self.get_min() if key < self.get_root().get_key() else self.get_max()
+		x = finger
+		par = x.get_parent()
+		while par is not None and key != x.get_key():
+			if key > x.get_key() and par.get_left() is x and par.get_key() > key:
+				break
+			if key < x.get_key() and par.get_right() is x and par.get_key() < key:
+				break
+			x, par = par, par.get_parent()
+			cnt += 1
+		y = x
+		while x.is_real_node():
+			cnt += 1
+			if key == x.get_key():
+				return x, cnt
+			y = x
+			if key < x.get_key():
+				x = x.get_left()
+			else:
+				x = x.get_right()
+		return y, cnt
+
+	"""searches for a node corresponding to the key, starting from the closer end of the tree
+
+	@type key: int
+	@param key: a key to be searched
+	@rtype: AVLNode
+	@returns: node corresponding to key, None if key is not in self
+	"""
+	def finger_search(self, key):
+		x, cnt = self.finger_closest(key)
+		if x is None:
+			return None  # tree is empty
+		return x if x.get_key() == key else None
+
+	"""inserts val, starting the search from the closer end of the tree. only the descent is
+	O(1) amortized for keys that arrive in (almost) sorted order - the insertion still updates
+	the path to the root (see fix_after), so the whole insert is O(log n), no faster than insert
+
+	@type key: int
+	@pre: key currently does not appear in the dictionary
+	@param key: key of item that is to be inserted to self
+	@type val: any
+	@param val: the value of the item
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	@raises KeyError: if key is already in the dictionary
+	"""
+	def finger_insert(self, key, val):
+		x, cnt = self.finger_closest(key)
+		if x is not None and x.get_key() == key:
+			raise KeyError("key %r is already in the tree" % (key,))
+		return self.insert_under(x, key, val)[1]
+
+	"""performs insert using finger-tree technic:
 	starting from tree's max node and going up to the first
 	node ('x') with key smaller then inserted-key ->
-	then performing normal insert, only on the node's sub-tree   
+	then performing normal insert, only on the node's sub-tree
+
+	@rtype: (int, int)
+	@returns: the number of keys larger than key, and the number of search & rebalancing steps
 	"""
 	def FT_insert(self, key, val):
-		y = AVLNode(key, val)
+		y = self.make_node(key, val)
 		if self.get_root() is None:
 			self.set_root(y)
-			self.set_min(y)
-			return 0
-		# up till here - same as normal insert
+			return 0, 0
 		x = self.get_max()
 		cnt = 0
 		while x.get_key() > key and x.get_parent() is not None:
 			x = x.get_parent()
 			cnt += 1
-		sub_tree = AVLTree(x)
-		# from here on - same as normal insert (only now in a smaller tree)
-		par, add = sub_tree.search_closest(key)
-		# for tests - change search_closest to counter that returns (node, cnt)
+		par = x
+		while x.is_real_node():  # normal insert, only in x's sub-tree
+			par = x
+			cnt += 1
+			x = x.get_left() if key < x.get_key() else x.get_right()
 		y.set_parent(par)
 		self.update_min(y, True)
 		cnt += self.fix_after(par)
-		return self.size()-self.rank(y), cnt  # num of changes, cnt
+		return self.size()-self.rank(y), cnt
 
 	"""deletes node from the dictionary
 
 	@type node: AVLNode
 	@pre: node is a real pointer to a node in self
+	@type release: bool
+	@param release: give node to the tree's NodePool (if any) once it is removed, False to keep it
 	@rtype: int
 	@returns: the number of rebalancing operation due to AVL rebalancing
 	"""
-	def delete(self, node: AVLNode):
+	def delete(self, node: AVLNode, release=True):
 		cnt = 0
+		if self.fingers is not None:
+			self.fingers.discard(node)
 		self.update_min(node, False)
 		par = node.get_parent()
 		sons = (node.get_left(), node.get_right())
@@ -456,7 +1448,10 @@ class AVLTree(object):
 				cnt += 1
 		else:  # no has 1 son or no sons
 			self.simple_delete(node, sons, par)
-		return cnt + self.fix_after(par, None)
+		cnt += self.fix_after(par, None)
+		if release and self.pool is not None:
+			self.pool.release(node)
+		return cnt
 
 	"""basic (BST) deletion of a node less then 2 sons"""
 
@@ -526,17 +1521,55 @@ class AVLTree(object):
 	"""
 	def avl_to_array(self):
 		lst = list()
-		if self.get_root() is None:
-			return lst
+		stack = []  # in-order walk without recursion
+		x = self.root
+		while stack or (x is not None and x.is_real_node()):
+			while x is not None and x.is_real_node():
+				stack.append(x)
+				x = x.get_left()
+			x = stack.pop()
+			lst.append((x.get_key(), x.get_value()))
+			x = x.get_right()
+		return lst
+
+	"""iterates over the items of the dictionary with lo <= key <= hi, in order of keys.
+	seeks lo in O(log n) and then walks successors lazily: O(log n + k) time for k items,
+	O(1) memory. the dictionary must not change while iterating
+
+	@type lo: int
+	@param lo: the smallest key, None for no lower bound
+	@type hi: int
+	@param hi: the largest key, None for no upper bound
+	@type inclusive: tuple
+	@param inclusive: (lo included, hi included)
+	@rtype: generator
+	@returns: (key, value) tuples
+	"""
+	def iter_range(self, lo=None, hi=None, inclusive=(True, True)):
+		if lo is None:
+			x = self.get_min()
+		else:
+			x = self.search_closest(lo)
+			if x is not None and (x.get_key() < lo or (x.get_key() == lo and not inclusive[0])):
+				x = x.get_successor()
+		while x is not None:
+			key = x.get_key()
+			if hi is not None and (key > hi or (key == hi and not inclusive[1])):
+				return
+			yield key, x.get_value()
+			x = x.get_successor()
 
-		def in_order(x: AVLNode):
-			if x.is_real_node():
-				in_order(x.get_left())
-				lst.append((x.get_key(), x.get_value()))
-				in_order(x.get_right())
-			return lst
+	"""iterates over the (key, value) items of the dictionary, in order of keys"""
+	def items(self):
+		return self.iter_range()
+
+	"""iterates over the keys of the dictionary, in order"""
+	def keys(self):
+		return (key for key, val in self.iter_range())
 
-		return in_order(self.root)
+	"""iterates over the values of the dictionary, in order of keys"""
+	def values(self):
+		return (val for key, val in self.iter_range())
 
 	"""splits the dictionary at a given node
 
@@ -547,33 +1580,46 @@ class AVLTree(object):
 	@returns: a list [left, right], where left is an AVLTree representing the keys in the 
 	dictionary smaller than node.key, right is an AVLTree representing the keys in the 
 	dictionary larger than node.key.
+	@type release: bool
+	@param release: give node to the tree's NodePool (if any) once it is cut out, False to keep it
 	"""
 
-	def split(self, node: AVLNode):
-		allJoins = []
+	def split(self, node: AVLNode, release=True):
+		if self.fingers is not None:
+			self.fingers.clear()
 		par = node.get_parent()
 		if par is None:
 			self.set_root(None)
-			return [AVLTree(self.detach(node, True)).update_min(),
-					AVLTree(self.detach(node, False)).update_min()]
-
-		r_son = (par.get_right() == node)
-		left = AVLTree(self.detach(node, True))
-		right = AVLTree(self.detach(node, False))
-
+			res = [self.spawn(self.detach(node, True)).update_min(),
+					self.spawn(self.detach(node, False)).update_min()]
+		else:
+			r_son = (par.get_right() == node)
+			left = self.spawn(self.detach(node, True))
+			right = self.spawn(self.detach(node, False))
+			res = self.split_up(par, r_son, left, right)
+		if release and self.pool is not None:
+			self.pool.release(node)
+		return res
+
+	"""climbs from par to the root, joining every node on the way (with its other subtree)
+	into left or right. r_son tells if the split point is in par's right subtree
+	@rtype: list
+	@returns: [left, right]"""
+	def split_up(self, par, r_son, left, right):
+		allJoins = []
 		while par is not None:
 			tmpP = par.get_parent()
 			tmpS = (tmpP.get_right() == par) if tmpP is not None else None
 
 			if r_son:
-				L = AVLTree()
+				L = self.spawn()
 				L.set_root(self.detach(par, True))
 				if left.get_root() is None:
 					allJoins.append(AVLTree.join_by_node(left, L, par))
 				else:
 					allJoins.append(AVLTree.join_by_node(L, left, par))
 			else:
-				R = AVLTree()
+				R = self.spawn()
 				R.set_root(self.detach(par, False))
 				if R.get_root() is not None:
 					allJoins.append(AVLTree.join_by_node(right, R, par))
@@ -588,6 +1634,76 @@ class AVLTree(object):
 		self.set_root(None)
 		return [left, right]
 
+	"""splits the dictionary by a key, that doesn't have to be in the dictionary
+
+	@type key: int
+	@param key: The key according to whom we split
+	@rtype: list
+	@returns: a list [left, node, right], where left and right are AVLTrees holding the keys
+	smaller and larger than key, and node is the (detached) node of key, or None if key is not in self
+	"""
+	def split_key(self, key):
+		if self.fingers is not None:
+			self.fingers.clear()
+		x = self.search_closest(key)
+		if x is None:
+			return [self.spawn(), None, self.spawn()]
+		if x.get_key() == key:
+			left, right = self.split(x, False)
+			return [left, x, right]
+		# key would be x's (virtual) son - so x is the first node to join into a side
+		left, right = self.split_up(x, key > x.get_key(), self.spawn(), self.spawn())
+		return [left, None, right]
+
+	"""cuts the keys with lo <= key <= hi out of the dictionary: two split_keys and one join,
+	O(log n) however many keys are cut out. split_up joins once per level of the split path,
+	and each join_by_node updates & rebalances only from the joining node up to the root of
+	the joined tree - |h1 - h2| + 1 nodes, as the node hangs at the shorter tree's height on
+	the taller one's spine. the trees a split accumulates grow level by level, so these
+	differences telescope to O(log n) over the whole path rather than O(log n) per level
+
+	@type lo: int
+	@param lo: the smallest key, None for no lower bound
+	@type hi: int
+	@param hi: the largest key, None for no upper bound
+	@type inclusive: tuple
+	@param inclusive: (lo included, hi included)
+	@rtype: AVLTree
+	@returns: a tree with self's settings holding the keys cut out
+	"""
+	def extract_range(self, lo=None, hi=None, inclusive=(True, True)):
+		left, rest = self.spawn(), self.spawn().adopt(self)
+		if lo is not None:
+			left, x, rest = self.split_key(lo)
+			if x is not None:  # lo's own node goes back to the side it belongs to
+				x.clear_links()
+				if inclusive[0]:
+					rest, cnt = AVLTree.join_trees(self.spawn(), x, rest)
+				else:
+					left, cnt = AVLTree.join_trees(left, x, self.spawn())
+		mid, right = rest, self.spawn()
+		if hi is not None:
+			mid, y, right = rest.split_key(hi)
+			if y is not None:
+				y.clear_links()
+				if inclusive[1]:
+					mid, cnt = AVLTree.join_trees(mid, y, self.spawn())
+				else:
+					right, cnt = AVLTree.join_trees(self.spawn(), y, right)
+		tree, cnt = AVLTree.join_trees2(left, right)
+		self.adopt(tree)
+		return mid
+
+	"""deletes the keys with lo <= key <= hi from the dictionary in O(log n), see extract_range.
+	the nodes cut out are left to the garbage collector, not given to the tree's NodePool,
+	which would cost O(k)
+
+	@rtype: int
+	@returns: the number of keys deleted
+	"""
+	def delete_range(self, lo=None, hi=None, inclusive=(True, True)):
+		return self.extract_range(lo, hi, inclusive).size()
+
 	"""returns subtree of node as AVLTree
 	and detach node from tree"""
 
@@ -614,7 +1730,10 @@ class AVLTree(object):
 	@returns: the absolute value of the difference between the height of the AVL trees joined
 	"""
 	def join(self, tree, key, val):
-		x = AVLNode(key, val, None)
+		for t in (self, tree):
+			if t.fingers is not None:
+				t.fingers.clear()
+		x = self.make_node(key, val)
 		if self.get_root() is not None and\
 				(tree.get_root() is None or tree.get_root().get_key() < key):
 			# only tree is empty or tree is the smaller-key's tree
@@ -625,12 +1744,13 @@ class AVLTree(object):
 
 		self.update_min(self.get_root())
 		tree.set_min(self.get_min())
-		# tree.set_max(self.get_max())   #for FT-insert
+		tree.set_max(self.get_max())
 		return h_diff
 
 	"""joins self with another AVLTree by a given node
-	@pre: if self is not empty - self.root.key < x.key < tree.root.key (tree also not empty)"""
-	def join_by_node(self, tree, x: AVLNode):
+	@pre: if self is not empty - self.root.key < x.key < tree.root.key (tree also not empty)
+	@returns: the number of rebalancing operations if rebalances == True, else as join"""
+	def join_by_node(self, tree, x: AVLNode, rebalances=False):
 		h1 = self.tree_height()  # self is always the smaller-keys tree or empty
 		h2 = tree.tree_height()
 		if self.get_root() is None:  # if self is empty
@@ -638,14 +1758,14 @@ class AVLTree(object):
 				y = tree.search_closest(x.get_key())
 				x.set_parent(y)
 				x.update_node()
-				tree.fix_after(y)
+				cnt = tree.fix_after(y)
 				self.set_root(tree.get_root())
-				return h2 + 1
+				return cnt if rebalances else h2 + 1
 			else:
 				self.set_root(x)
 				tree.set_root(x)
 				x.update_node()
-			return 1
+			return 0 if rebalances else 1
 
 		if h1 > h2:
 			tree.connect(self, x, h2, False)
@@ -654,9 +1774,9 @@ class AVLTree(object):
 
 		x.get_left().update_node() if x.get_left().is_real_node() else None
 		x.get_right().update_node() if x.get_right().is_real_node() else None
-		self.fix_after(x, None)
+		cnt = self.fix_after(x, None)
 		tree.set_root(self.get_root())
-		return abs(h1-h2)+1
+		return cnt if rebalances else abs(h1-h2)+1
 
 	""" @pre: self.height <= tree.height
 	prevent code duplicate...
@@ -675,6 +1795,282 @@ class AVLTree(object):
 		x.update_node()
 		self.get_root().update_node()
 
+	"""joins left, x, right into one tree (any of left, right may be empty)
+	@pre: left.keys < x.key < right.keys, x is a lone node
+	@rtype: (AVLTree, int)
+	@returns: the joined tree and the number of rebalancing operations"""
+	@staticmethod
+	def join_trees(left, x: AVLNode, right):
+		if right.get_root() is None and left.get_root() is not None:
+			cnt = right.join_by_node(left, x, True)  # empty self inserts x into the other tree
+			return left.update_min(), cnt
+		cnt = left.join_by_node(right, x, True)
+		return left.update_min(), cnt
+
+	"""joins left & right (left.keys < right.keys) into one tree, using left's maximum as the separating node
+	@rtype: (AVLTree, int)
+	@returns: the joined tree and the number of rebalancing operations"""
+	@staticmethod
+	def join_trees2(left, right):
+		if left.get_root() is None:
+			return right, 0
+		if right.get_root() is None:
+			return left, 0
+		x = left.get_root().go_to_h(-1, False)
+		cnt = left.delete(x, False)
+		x.clear_links()
+		tree, c = AVLTree.join_trees(left, x, right)
+		return tree, cnt + c
+
+	"""re-hangs left & right (new roots of x's subtrees, detached or still x's sons) under x.
+	heights that drifted by more than 1 are fixed by joining left, x, right
+	@rtype: (AVLNode, int)
+	@returns: the new (detached) root of x's subtree and the number of rebalancing operations"""
+	def relink(self, x: AVLNode, left: AVLNode, right: AVLNode):
+		if abs(left.get_height() - right.get_height()) <= 1:
+			for son, is_left in ((left, True), (right, False)):
+				if son.is_real_node():
+					son.set_parent(x)
+				else:
+					x.virtual_son(is_left)
+			return x, 1 if x.update_node() else 0
+		x.clear_links()
+		tree, cnt = AVLTree.join_trees(AVLTree.detached(left), x, AVLTree.detached(right))
+		return tree.get_root(), cnt
+
+	"""drops x, joining left & right (new roots of x's subtrees) without it, see relink
+	@rtype: (AVLNode, int)
+	@returns: the new (detached) root of x's subtree, VIRTUAL if empty, and the number of rebalancing operations"""
+	def unlink(self, x: AVLNode, left: AVLNode, right: AVLNode):
+		left, right = AVLTree.detached(left), AVLTree.detached(right)
+		x.clear_links()
+		if self.pool is not None:
+			self.pool.release(x)
+		tree, cnt = AVLTree.join_trees2(left, right)
+		root = tree.get_root()
+		return (VIRTUAL if root is None else root), cnt + 1
+
+	"""returns the subtree of x, cut from its parent, as an AVLTree (empty if x is virtual)"""
+	@staticmethod
+	def detached(x: AVLNode):
+		if not x.is_real_node():
+			return AVLTree()
+		x.set_parent(None)
+		return AVLTree(x)
+
+	"""merges items[lo:hi] (sorted by key, keys[i] == items[i][0]) into the subtree of x.
+	all the batch's keys share one descent: the batch is cut by x's key (bisect) and each
+	part goes down its side, reaching virtual sons as balanced subtrees built by build_sorted
+	@rtype: (AVLNode, int)
+	@returns: the new (detached) root of x's subtree and the number of rebalancing operations"""
+	def insert_batch(self, x: AVLNode, items, keys, lo, hi, merge):
+		if lo == hi:
+			return x, 0
+		if not x.is_real_node():
+			return self.build_sorted(items[lo:hi]), 0
+		i = j = bisect_left(keys, x.get_key(), lo, hi)
+		if i < hi and keys[i] == x.get_key():
+			x.value = merge(x.get_value(), items[i][1])  # relink refreshes x's aggregates
+			j += 1
+		left, c1 = self.insert_batch(x.get_left(), items, keys, lo, i, merge)
+		right, c2 = self.insert_batch(x.get_right(), items, keys, j, hi, merge)
+		x, c3 = self.relink(x, left, right)
+		return x, c1 + c2 + c3
+
+	"""removes keys[lo:hi] (sorted) from the subtree of x, the same way as insert_batch
+	@rtype: (AVLNode, int)
+	@returns: the new (detached) root of x's subtree and the number of rebalancing operations"""
+	def delete_batch(self, x: AVLNode, keys, lo, hi):
+		if lo == hi or not x.is_real_node():
+			return x, 0
+		i = j = bisect_left(keys, x.get_key(), lo, hi)
+		if i < hi and keys[i] == x.get_key():
+			j += 1
+		left, c1 = self.delete_batch(x.get_left(), keys, lo, i)
+		right, c2 = self.delete_batch(x.get_right(), keys, j, hi)
+		x, c3 = self.relink(x, left, right) if i == j else self.unlink(x, left, right)
+		return x, c1 + c2 + c3
+
+	"""keeps only items[lo:hi]'s keys (sorted, keys[i] == items[i][0]) in the subtree of x,
+	the same way as insert_batch. subtrees that no key reaches are dropped whole
+	@rtype: (AVLNode, int)
+	@returns: the new (detached) root of x's subtree and the number of rebalancing operations"""
+	def intersect_batch(self, x: AVLNode, items, keys, lo, hi, merge):
+		if lo == hi or not x.is_real_node():
+			return VIRTUAL, 0
+		i = j = bisect_left(keys, x.get_key(), lo, hi)
+		if i < hi and keys[i] == x.get_key():
+			x.value = merge(x.get_value(), items[i][1])  # relink refreshes x's aggregates
+			j += 1
+		left, c1 = self.intersect_batch(x.get_left(), items, keys, lo, i, merge)
+		right, c2 = self.intersect_batch(x.get_right(), items, keys, j, hi, merge)
+		x, c3 = self.unlink(x, left, right) if i == j else self.relink(x, left, right)
+		return x, c1 + c2 + c3
+
+	"""merges the cursor's items with keys < hi into the subtree of x, the way insert_batch,
+	intersect_batch & delete_batch do for mode 'union', 'intersection' & 'difference', but reading
+	the items in order instead of bisecting a list: a subtree is skipped when the cursor's next key
+	is past it, so the cost is the batch functions' O(m*log(n/m + 1)) for m items
+	@rtype: (AVLNode, int)
+	@returns: the new (detached) root of x's subtree and the number of rebalancing operations"""
+	def merge_walk(self, x: AVLNode, cur, hi, mode, merge):
+		if not cur.before(hi):
+			return (VIRTUAL if mode == 'intersection' else x), 0
+		if not x.is_real_node():
+			if mode == 'union':
+				return self.build_sorted(cur.take(hi)), 0
+			cur.skip(hi)
+			return x, 0
+		key = x.get_key()
+		left, c1 = self.merge_walk(x.get_left(), cur, key, mode, merge)
+		found = cur.before(hi) and cur.key == key
+		if found:
+			if mode != 'difference':
+				x.value = merge(x.get_value(), cur.value)  # relink refreshes x's aggregates
+			cur.advance()
+		right, c2 = self.merge_walk(x.get_right(), cur, hi, mode, merge)
+		keep = found if mode == 'intersection' else not found if mode == 'difference' else True
+		x, c3 = self.relink(x, left, right) if keep else self.unlink(x, left, right)
+		return x, c1 + c2 + c3
+
+	"""takes the result of insert_batch/delete_batch/intersect_batch/merge_walk as self's new root"""
+	def set_batch_root(self, root: AVLNode):
+		if self.fingers is not None:
+			self.fingers.clear()
+		if root.is_real_node():
+			root.set_parent(None)
+			self.root = root
+		else:
+			self.root = None
+		return self.update_min()
+
+	"""inserts a batch of items in one pass: the batch is sorted and pushed down the tree once
+	(see insert_batch), so its keys share their search paths and every touched node is updated once.
+	O(k*log(n/k + 1)) for k items. keys already in self get the batch's value
+
+	@type pairs: iterable
+	@param pairs: (key, value) pairs, in any order. for a repeated key the last value wins
+	@rtype: int
+	@returns: the number of rebalancing operations, summed over the whole batch
+	"""
+	def insert_many(self, pairs):
+		items = sort_items(pairs)
+		root, cnt = self.insert_batch(self.root or VIRTUAL, items, [key for key, val in items],
+									0, len(items), lambda old, new: new)
+		self.set_batch_root(root)
+		return cnt
+
+	"""deletes a batch of keys in one pass, see insert_many. keys not in self are ignored
+
+	@type keys: iterable
+	@param keys: keys to delete, in any order
+	@rtype: int
+	@returns: the number of rebalancing operations, summed over the whole batch
+	"""
+	def delete_many(self, keys):
+		keys = sorted(set(keys))
+		root, cnt = self.delete_batch(self.root or VIRTUAL, keys, 0, len(keys))
+		self.set_batch_root(root)
+		return cnt
+
+	"""adds tree's items to self. tree's items are walked in order and pushed down self in one pass
+	(see merge_walk), O(m*log(n/m + 1)) for m = tree.size(), n = self.size(). tree is not changed
+
+	@type tree: AVLTree
+	@param tree: the dictionary to unite with self
+	@type merge: function
+	@param merge: merge(self_val, tree_val) gives the value of a key in both trees, self's value if None
+	@rtype: AVLTree
+	@returns: self
+	"""
+	def union(self, tree, merge=None):
+		merge = merge or (lambda val, other: val)
+		root, cnt = self.merge_walk(self.root or VIRTUAL, ItemCursor(tree.items()), None, 'union', merge)
+		return self.set_batch_root(root)
+
+	"""filters self's keys by looking them up: a key stays if lookup(key) finds a node exactly
+	when keep_found, and a key found & kept gets merge(self_val, found_val). self is walked in
+	order and the dropped keys are deleted by one delete_batch, so the surviving nodes stay in
+	place. intersection & difference use it when self is the smaller tree
+
+	@type lookup: function
+	@param lookup: lookup(key) gives the other tree's node of key, None if it has none
+	@type keep_found: bool
+	@rtype: int
+	@returns: the number of rebalancing operations
+	"""
+	def filter_by_lookup(self, lookup, keep_found, merge=None):
+		doomed = []
+		x = self.get_min()
+		while x is not None:
+			y = lookup(x.get_key())
+			if (y is not None) != keep_found:
+				doomed.append(x.get_key())
+			elif merge is not None:
+				x.value = merge(x.get_value(), y.get_value())
+			x = x.get_successor()
+		if merge is not None and self.monoids is not None:
+			self.refresh_aggregates()  # once for all the merged values, not a walk up per value
+		root, cnt = self.delete_batch(self.root or VIRTUAL, doomed, 0, len(doomed))
+		self.set_batch_root(root)
+		return cnt
+
+	"""recomputes the aggregates of every node, sons before parents, in O(n)"""
+	def refresh_aggregates(self):
+		order = []
+		stack = [self.root] if self.root is not None else []
+		while stack:  # pre-order: a node comes before its sons
+			x = stack.pop()
+			order.append(x)
+			for son in (x.get_left(), x.get_right()):
+				if son.is_real_node():
+					stack.append(son)
+		for x in reversed(order):
+			x.update_agg()
+		return None
+
+	"""keeps in self only the keys that are also in tree, O(m*log(n/m + 1)) for m <= n,
+	where m is the smaller size. tree is not changed
+
+	@type tree: AVLTree
+	@param tree: the dictionary to intersect with self
+	@type merge: function
+	@param merge: merge(self_val, tree_val) gives the value of a key in both trees, self's value if None
+	@rtype: AVLTree
+	@returns: self
+	"""
+	def intersection(self, tree, merge=None):
+		merge = merge or (lambda val, other: val)
+		if self.size() < tree.size():  # look self's few keys up in tree instead
+			self.filter_by_lookup(tree.search, True, merge)
+			return self
+		root, cnt = self.merge_walk(self.root or VIRTUAL, ItemCursor(tree.items()), None, 'intersection', merge)
+		return self.set_batch_root(root)
+
+	"""removes from self every key that is in tree, O(m*log(n/m + 1)) for m <= n,
+	where m is the smaller size. tree is not changed
+
+	@type tree: AVLTree
+	@param tree: the dictionary whose keys are removed from self
+	@rtype: AVLTree
+	@returns: self
+	"""
+	def difference(self, tree):
+		if self.size() < tree.size():  # look self's few keys up in tree instead
+			self.filter_by_lookup(tree.search, False)
+			return self
+		root, cnt = self.merge_walk(self.root or VIRTUAL, ItemCursor(tree.items()), None, 'difference', None)
+		return self.set_batch_root(root)
+
+	"""makes self hold tree's nodes"""
+	def adopt(self, tree):
+		if self.fingers is not None:
+			self.fingers.clear()
+		self.root = tree.get_root()
+		self.Tmin = tree.get_min()
+		self.Tmax = tree.get_max()
+		return self
+
 	"""compute the rank of node in the self
 
 	@type node: AVLNode
@@ -694,6 +2090,142 @@ class AVLTree(object):
 			par = par.get_parent()
 		return r
 
+	"""compute the rank of a key in self, in one descent from the root
+
+	@type key: int
+	@param key: a key to be searched
+	@rtype: int
+	@returns: the rank of key in self, None if key is not in self
+	"""
+	def rank_of_key(self, key):
+		r = 0
+		x = self.get_root()
+		while x is not None and x.is_real_node():
+			if key == x.get_key():
+				return r + x.get_left().get_size() + 1
+			elif key < x.get_key():
+				x = x.get_left()
+			else:
+				r += x.get_left().get_size() + 1
+				x = x.get_right()
+		return None
+
+	"""counts the keys smaller than key (or smaller or equal if right == True), key needn't be in self
+
+	@rtype: int
+	@returns: the number of keys < key (<= key if right)
+	"""
+	def count_smaller(self, key, right=False):
+		r = 0
+		x = self.get_root()
+		while x is not None and x.is_real_node():
+			if x.get_key() < key or (right and x.get_key() == key):
+				r += x.get_left().get_size() + 1
+				x = x.get_right()
+			else:
+				x = x.get_left()
+		return r
+
+	"""the index key would have in the sorted keys of self, before any equal key
+	(as bisect.bisect_left on the keys list)
+
+	@rtype: int
+	@returns: the number of keys smaller than key
+	"""
+	def bisect_left(self, key):
+		return self.count_smaller(key)
+
+	"""the index key would have in the sorted keys of self, after any equal key
+	(as bisect.bisect_right on the keys list)
+
+	@rtype: int
+	@returns: the number of keys smaller than or equal to key
+	"""
+	def bisect_right(self, key):
+		return self.count_smaller(key, True)
+
+	"""counts the keys with lo <= key <= hi without visiting them, in O(log n)
+
+	@type lo: int
+	@param lo: the smallest key, None for no lower bound
+	@type hi: int
+	@param hi: the largest key, None for no upper bound
+	@type inclusive: tuple
+	@param inclusive: (lo included, hi included)
+	@rtype: int
+	@returns: the number of keys in the range
+	"""
+	def count_range(self, lo=None, hi=None, inclusive=(True, True)):
+		below = 0 if lo is None else self.count_smaller(lo, not inclusive[0])
+		upto = self.size() if hi is None else self.count_smaller(hi, inclusive[1])
+		return max(0, upto - below)
+
+	"""aggregates the values of the keys with lo <= key <= hi in O(log n), using the
+	aggregates kept in the nodes: only the two boundary paths are visited
+
+	@type lo: int
+	@param lo: the smallest key, None for no lower bound
+	@type hi: int
+	@param hi: the largest key, None for no upper bound
+	@type name: str
+	@param name: the aggregate to return, all of them (as a dict) if None
+	@type inclusive: tuple
+	@param inclusive: (lo included, hi included)
+	@returns: the aggregate over the range, the monoid's identity for an empty range
+	"""
+	def aggregate(self, lo=None, hi=None, name=None, inclusive=(True, True)):
+		if self.monoids is None:
+			raise ValueError("tree keeps no aggregates")
+		monoids = self.monoids
+		identity = tuple(m.identity for m in monoids)
+
+		def combine(a, b):
+			return tuple(m.combine(p, q) for m, p, q in zip(monoids, a, b))
+
+		def own(x):  # x's aggregate, without its subtree
+			return tuple(m.lift(x.get_value()) for m in monoids)
+
+		def agg(x):
+			return x.agg if x.is_real_node() else identity
+
+		def above_lo(key):
+			return lo is None or key > lo or (key == lo and inclusive[0])
+
+		def below_hi(key):
+			return hi is None or key < hi or (key == hi and inclusive[1])
+
+		x = self.get_root()  # the top node in range - both boundary paths start below it
+		while x is not None and x.is_real_node():
+			if not above_lo(x.get_key()):
+				x = x.get_right()
+			elif not below_hi(x.get_key()):
+				x = x.get_left()
+			else:
+				break
+		if x is None or not x.is_real_node():
+			res = identity
+		else:
+			acc_l, y = identity, x.get_left()  # keys >= lo in x's left subtree, collected from the largest
+			while y.is_real_node():
+				if above_lo(y.get_key()):
+					acc_l = combine(own(y), combine(agg(y.get_right()), acc_l))
+					y = y.get_left()
+				else:
+					y = y.get_right()
+			acc_r, y = identity, x.get_right()  # keys <= hi in x's right subtree, collected from the smallest
+			while y.is_real_node():
+				if below_hi(y.get_key()):
+					acc_r = combine(acc_r, combine(agg(y.get_left()), own(y)))
+					y = y.get_right()
+				else:
+					y = y.get_left()
+			res = combine(acc_l, combine(own(x), acc_r))
+
+		names = list(self.aggregates)
+		if name is not None:
+			return res[names.index(name)]
+		return dict(zip(names, res))
+
 	"""finds the i'th smallest item (according to keys) in self
 
 	@type i: int
@@ -703,33 +2235,104 @@ class AVLTree(object):
 	@returns: the item of rank i in self
 	"""
 	def select(self, i):
+		n = self.size()
+		if i <= self.get_root().get_left().get_size() + 1:
+			# find the minimal subtree that contain ranks {1,..i}: a prefix of the keys
+			x = self.get_min()
+			while x.get_size() < i:
+				x = x.get_parent()
+			return self.select_in(x, i)
+		# the wanted node is on tree's right side: find the minimal subtree that contain
+		# ranks {i,..n} - a suffix of the keys, climbing from the maximum
+		x = self.get_max()
+		while x.get_size() < n - i + 1:
+			x = x.get_parent()
+		return self.select_in(x, i - (n - x.get_size()))
+
+	"""finds the j'th smallest item in the subtree of x, iteratively
 
-		def select_rec(node: AVLNode, j):
-			r = node.get_left().get_size()+1 if node.is_real_node() else 0
+	@pre: 1 <= j <= x.get_size()
+	@rtype: AVLNode
+	"""
+	def select_in(self, x: AVLNode, j):
+		while True:
+			r = x.get_left().get_size() + 1
 			if j == r:
-				return node
+				return x
 			elif j < r:
-				return select_rec(node.get_left(), j)
-				# search for the j'th smallest item in the left subtree
+				x = x.get_left()  # search for the j'th smallest item in the left subtree
 			else:
-				return select_rec(node.get_right(), j - r)
-				# search for the j-r'th smallest item in the right subtree
+				x = x.get_right()  # search for the j-r'th smallest item in the right subtree
+				j -= r
 
-		if self.get_root().get_left().size+1 <= i:  # the wanted node is on tree's right side
-			return select_rec(self.get_root(), i)  # can't use finger tree's
-		# else - node's rank is smaller than root's rank.
-		# find the minimal subtree that contain ranks {1,..i}
-		x = self.get_min()
-		while x.get_size() < i:
-			x = x.get_parent()  # find the minimal node  tree
-		return select_rec(x, i)   # preform select(i) on the minimal tree
+	"""finds the items of many ranks in one shared traversal: the ranks are sorted and
+	pushed down the tree once (as in search_many), O(k*log(n/k + 1)) for k ranks
+
+	@type ranks: list
+	@pre: 1 <= rank <= self.size() for every rank
+	@param ranks: the ranks to be selected, in any order
+	@rtype: list
+	@returns: the nodes of ranks, in ranks' order
+	"""
+	def select_many(self, ranks):
+		order = sorted(range(len(ranks)), key=ranks.__getitem__)
+		sranks = [ranks[j] for j in order]
+		res = [None] * len(ranks)
+		if self.root is not None:
+			self.select_batch(self.root, 0, sranks, 0, len(sranks), order, res)
+		return res
+
+	"""finds ranks[lo:hi] (sorted) in the subtree of x, whose keys come after base others.
+	the node of ranks[i] goes to res[order[i]]"""
+	def select_batch(self, x: AVLNode, base, ranks, lo, hi, order, res):
+		while lo < hi and x.is_real_node():
+			if hi - lo == 1:  # a lone rank goes down alone, without bisecting
+				res[order[lo]] = self.select_in(x, ranks[lo] - base)
+				return None
+			pos = base + x.get_left().get_size() + 1
+			i = j = bisect_left(ranks, pos, lo, hi)
+			while j < hi and ranks[j] == pos:  # a rank may repeat
+				res[order[j]] = x
+				j += 1
+			if i - lo < hi - j:  # recurse into the smaller side, loop on the larger one
+				self.select_batch(x.get_left(), base, ranks, lo, i, order, res)
+				x, base, lo = x.get_right(), pos, j
+			else:
+				self.select_batch(x.get_right(), pos, ranks, j, hi, order, res)
+				x, hi = x.get_left(), i
+		return None
+
+	"""returns the keys at quantiles qs, by the nearest-rank method: the key of rank
+	ceil(q * n) (at least 1), found together by select_many
 
-	"""infers & performs the needed rotation at the node's level
+	@type qs: list
+	@param qs: quantiles, 0 <= q <= 1, e.g. [0.5, 0.9, 0.99, 0.999]
+	@rtype: list
+	@returns: the keys at qs, in qs' order, an empty list if the dictionary is empty
+	"""
+	def quantiles(self, qs):
+		n = self.size()
+		if n == 0:
+			return []
+		ranks = [min(n, max(1, math.ceil(q * n))) for q in qs]
+		return [x.get_key() for x in self.select_many(ranks)]
+
+	"""infers & performs the needed rotation at the node's level, and updates the path above it
 	@pre: |BF(node)| == 2
 	"""
 	def rotation(self, node: AVLNode):
-		cnt = 1
 		par = node.get_parent()
+		cnt = self.rotate(node)
+		self.update(par)
+		return cnt
+
+	"""infers & performs the needed rotation at the node's level, updating only the nodes rotated
+	@pre: |BF(node)| == 2
+	@rtype: int
+	@returns: 1 for a single rotation, 2 for a double one
+	"""
+	def rotate(self, node: AVLNode):
+		cnt = 1
 		if node.getBF() == 2:
 			l_son = node.get_left()
 			if l_son.getBF() == -1:
@@ -742,8 +2345,6 @@ class AVLTree(object):
 				cnt += 1
 				self.simple_rotate(r_son, False)
 			self.simple_rotate(node, True)
-
-		self.update(par)
 		return cnt
 
 	"""does a rotation to the left (left == True) or to the right (left == False)"""
@@ -0,0 +1,665 @@
+"""An AVL tree stored as parallel arrays, with int handles instead of node objects"""
+
+from array import array
+
+"""handle of the virtual node. it is never a parent, so it also stands for 'no parent'"""
+NIL = 0
+
+
+"""
+Struct-of-arrays storage shared by all trees split from (or joined into) the same tree.
+keys & values are any python objects so they are kept in lists,
+the structural fields are typed arrays.
+"""
+
+
+class NodeStore(object):
+	__slots__ = ('keys', 'values', 'left', 'right', 'parent', 'height', 'size', 'free')
+
+	def __init__(self):
+		# slot 0 is the virtual node - height -1, size 0
+		self.keys = [None]
+		self.values = [None]
+		self.left = array('q', [NIL])
+		self.right = array('q', [NIL])
+		self.parent = array('q', [NIL])
+		self.height = array('b', [-1])
+		self.size = array('q', [0])
+		self.free = []
+
+	"""allocates a leaf holding key & val
+
+	@rtype: int
+	@returns: the handle of the new node
+	"""
+	def new(self, key, val):
+		if self.free:
+			x = self.free.pop()
+			self.keys[x], self.values[x] = key, val
+			self.left[x] = self.right[x] = self.parent[x] = NIL
+			self.height[x], self.size[x] = 0, 1
+			return x
+		self.keys.append(key)
+		self.values.append(val)
+		self.left.append(NIL)
+		self.right.append(NIL)
+		self.parent.append(NIL)
+		self.height.append(0)
+		self.size.append(1)
+		return len(self.keys) - 1
+
+	"""returns handle x to the free list, x must already be detached"""
+	def release(self, x):
+		self.keys[x] = self.values[x] = None
+		self.free.append(x)
+
+	"""returns a copy of the store, a few buffer copies"""
+	def copy(self):
+		other = NodeStore.__new__(NodeStore)
+		other.keys = self.keys[:]
+		other.values = self.values[:]
+		other.left = array('q', self.left)
+		other.right = array('q', self.right)
+		other.parent = array('q', self.parent)
+		other.height = array('b', self.height)
+		other.size = array('q', self.size)
+		other.free = self.free[:]
+		return other
+
+
+"""
+A read-only view of one node of an ArrayAVLTree, so that the ArrayAVLTree
+answers with the same node interface as AVLTree. views are created only
+at the API boundary - the tree itself works on int handles.
+"""
+
+
+class ArrayAVLNode(object):
+	__slots__ = ('store', 'handle')
+
+	def __init__(self, store, handle):
+		self.store, self.handle = store, handle
+
+	def get_key(self):
+		return self.store.keys[self.handle]
+
+	def get_value(self):
+		return self.store.values[self.handle]
+
+	def set_value(self, value):
+		self.store.values[self.handle] = value
+
+	def get_left(self):
+		return ArrayAVLNode(self.store, self.store.left[self.handle])
+
+	def get_right(self):
+		return ArrayAVLNode(self.store, self.store.right[self.handle])
+
+	"""@returns: the parent of self, None if there is no parent"""
+	def get_parent(self):
+		par = self.store.parent[self.handle]
+		return None if par == NIL else ArrayAVLNode(self.store, par)
+
+	def get_height(self):
+		return self.store.height[self.handle]
+
+	def get_size(self):
+		return self.store.size[self.handle]
+
+	def is_real_node(self):
+		return self.handle != NIL
+
+	def __eq__(self, other):
+		return isinstance(other, ArrayAVLNode) and \
+			self.store is other.store and self.handle == other.handle
+
+	def __ne__(self, other):
+		return not self == other
+
+	def __hash__(self):
+		return hash((id(self.store), self.handle))
+
+
+"""
+A class implementing an AVL tree over a NodeStore.
+same algorithms (and same rebalancing counts) as AVLTree, but every
+'node' is an int index into the store's arrays.
+"""
+
+
+class ArrayAVLTree(object):
+
+	"""
+	Constructor.
+	@type store: NodeStore
+	@param store: storage to allocate nodes from, a fresh one if None
+	@type root: int
+	@param root: handle of the root, NIL for an empty tree
+	"""
+	def __init__(self, store=None, root=NIL):
+		self.store = NodeStore() if store is None else store
+		self.root = root
+		self.Tmin = root
+
+	"""wraps handle x for the caller, None for NIL"""
+	def _view(self, x):
+		return None if x == NIL else ArrayAVLNode(self.store, x)
+
+	"""unwraps a node given by the caller"""
+	def _handle(self, node):
+		if node.store is not self.store:
+			raise ValueError("node does not belong to this tree's store")
+		return node.handle
+
+	"""returns a copy of self that shares nothing with it
+
+	@rtype: ArrayAVLTree
+	"""
+	def copy(self):
+		tree = ArrayAVLTree(self.store.copy(), self.root)
+		tree.Tmin = self.Tmin
+		return tree
+
+	"""changes tree's root to be @param new_root"""
+	def set_root(self, new_root):
+		if self.root == NIL or new_root == NIL:
+			self.Tmin = new_root
+		self.root = new_root
+
+	"""returns the root of the tree, None if the dictionary is empty
+
+	@rtype: ArrayAVLNode
+	"""
+	def get_root(self):
+		return self._view(self.root)
+
+	"""returns the tree's minimum"""
+	def get_min(self):
+		return self._view(self.Tmin)
+
+	"""returns the number of items in dictionary"""
+	def size(self):
+		return self.store.size[self.root]
+
+	"""returns tree's height"""
+	def tree_height(self):
+		return self.store.height[self.root]
+
+	"""updates self's Tmin according to the node inserted/deleted, see AVLTree.update_min"""
+	def update_min(self, x=NIL, insert=None):
+		st = self.store
+		if insert:
+			if self.Tmin == NIL or st.keys[x] < st.keys[self.Tmin]:
+				self.Tmin = x
+		elif insert == False:
+			if self.Tmin == x:
+				self.Tmin = self._successor(x)
+		elif self.root == NIL:
+			self.Tmin = NIL
+		else:
+			self.Tmin = self._go_to_h(self.root, -1, True)
+		return self
+
+	"""searches for a node in the dictionary corresponding to the key
+
+	@type key: int
+	@rtype: ArrayAVLNode
+	@returns: node corresponding to key, None if key is not in self
+	"""
+	def search(self, key):
+		x = self._search_closest(key)
+		if x == NIL or self.store.keys[x] != key:
+			return None
+		return ArrayAVLNode(self.store, x)
+
+	"""searches for a node corresponding to the key, or the closest node
+
+	@rtype: ArrayAVLNode
+	"""
+	def search_closest(self, key):
+		return self._view(self._search_closest(key))
+
+	def _search_closest(self, key):
+		keys, left, right = self.store.keys, self.store.left, self.store.right
+		x = self.root
+		y = NIL
+		while x != NIL:
+			k = keys[x]
+			if key == k:
+				return x
+			y = x
+			x = left[x] if key < k else right[x]
+		return y
+
+	"""inserts val at position i in the dictionary
+
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	@raises KeyError: if key is already in the dictionary, as AVLTree.insert
+	"""
+	def insert(self, key, val):
+		x = self._search_closest(key)
+		if x != NIL and self.store.keys[x] == key:
+			raise KeyError("key %r is already in the tree" % (key,))
+		y = self.store.new(key, val)
+		if self.root == NIL:
+			self.set_root(y)
+			return 0
+		self._set_parent(y, x)
+		self.update_min(y, True)
+		return self._fix_after(x)
+
+	"""deletes node from the dictionary, node's handle is recycled
+
+	@type node: ArrayAVLNode
+	@pre: node is a real pointer to a node in self
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	"""
+	def delete(self, node):
+		x = self._handle(node)
+		st = self.store
+		cnt = 0
+		self.update_min(x, False)
+		par = st.parent[x]
+		ls, rs = st.left[x], st.right[x]
+		if ls != NIL and rs != NIL:  # node has 2 real sons
+			suc = self._successor(x)
+			h = st.height[x]
+			par = self._full_delete(ls, rs, par, suc)
+			if h != st.height[suc]:
+				cnt += 1
+		else:  # node has 1 son or no sons
+			self._simple_delete(x, ls, rs, par)
+		cnt += self._fix_after(par, None)
+		st.release(x)
+		return cnt
+
+	def _simple_delete(self, x, ls, rs, par):
+		if ls != NIL:  # only left son
+			if self._set_parent(ls, par):
+				self.set_root(ls)
+		elif rs != NIL:  # only right son
+			if self._set_parent(rs, par):
+				self.set_root(rs)
+		elif self._virtual_son(x):  # x is a leaf, check if it is the root
+			self.set_root(NIL)
+
+	def _full_delete(self, ls, rs, par, suc):
+		st = self.store
+		suc_par = st.parent[suc]
+		if st.right[suc] != NIL:
+			if suc != rs:
+				self._set_parent(st.right[suc], suc_par)
+		else:
+			self._virtual_son(suc)
+
+		if self._set_parent(suc, par):
+			self.set_root(suc)
+
+		if suc == rs:  # successor is x's son, no change in suc.right
+			st.size[suc] += st.size[ls]
+			st.height[suc] = max(st.height[suc], st.height[ls] + 1)
+			self._set_parent(ls, suc)
+			return ls
+		self._set_parent(rs, suc)
+		st.size[suc] = st.size[ls] + st.size[rs] + 1
+		st.height[suc] = 1 + max(st.height[ls], st.height[rs])
+		self._set_parent(ls, suc)
+		return suc_par
+
+	"""returns an array representing dictionary
+
+	@rtype: list
+	@returns: a sorted list according to key of tuples (key, value)
+	"""
+	def avl_to_array(self):
+		st = self.store
+		keys, values, left, right = st.keys, st.values, st.left, st.right
+		lst = []
+		stack = []
+		x = self.root
+		while stack or x != NIL:
+			while x != NIL:
+				stack.append(x)
+				x = left[x]
+			x = stack.pop()
+			lst.append((keys[x], values[x]))
+			x = right[x]
+		return lst
+
+	"""splits the dictionary at a given node, node's handle is recycled
+
+	@type node: ArrayAVLNode
+	@pre: node is in self
+	@rtype: list
+	@returns: a list [left, right] of ArrayAVLTrees sharing self's store
+	"""
+	def split(self, node):
+		x = self._handle(node)
+		st = self.store
+		par = st.parent[x]
+		if par == NIL:
+			self.set_root(NIL)
+			trees = [ArrayAVLTree(st, self._detach(x, True)).update_min(),
+					ArrayAVLTree(st, self._detach(x, False)).update_min()]
+			st.release(x)
+			return trees
+
+		r_son = (st.right[par] == x)
+		left = ArrayAVLTree(st, self._detach(x, True))
+		right = ArrayAVLTree(st, self._detach(x, False))
+
+		while par != NIL:
+			tmpP = st.parent[par]
+			tmpS = (st.right[tmpP] == par) if tmpP != NIL else None
+
+			if r_son:
+				L = ArrayAVLTree(st)
+				L.set_root(self._detach(par, True))
+				if left.root == NIL:
+					left._join_by_node(L, par)
+				else:
+					L._join_by_node(left, par)
+			else:
+				R = ArrayAVLTree(st)
+				R.set_root(self._detach(par, False))
+				if R.root != NIL:
+					right._join_by_node(R, par)
+				else:
+					R._join_by_node(right, par)
+			par = tmpP
+			r_son = tmpS
+
+		right.update_min()
+		left.update_min()
+		self.set_root(NIL)
+		st.release(x)
+		return [left, right]
+
+	"""detaches x from its tree & returns x's left (or right) subtree's root"""
+	def _detach(self, x, left=True):
+		st = self.store
+		new_root = st.left[x] if left else st.right[x]
+		self._set_parent(x, NIL, True)
+		if new_root == NIL:
+			return NIL
+		self._set_parent(new_root, NIL, True)
+		self._update_node(x)
+		return new_root
+
+	"""joins self with key and another ArrayAVLTree, see AVLTree.join
+
+	@pre: all keys in self are smaller than key and all keys in tree are larger than key,
+	or the other way around.
+	@rtype: int
+	@returns: the absolute value of the difference between the height of the AVL trees joined
+	"""
+	def join(self, tree, key, val):
+		if tree.store is not self.store:
+			tree._move_to(self.store)
+		st = self.store
+		x = st.new(key, val)
+		if self.root != NIL and (tree.root == NIL or st.keys[tree.root] < key):
+			h_diff = tree._join_by_node(self, x)
+		else:
+			h_diff = self._join_by_node(tree, x)
+		self.update_min()
+		tree.Tmin = self.Tmin
+		return h_diff
+
+	"""copies self's nodes into store (O(size)) so self can be joined with its trees"""
+	def _move_to(self, store):
+		old = self.store
+		handles = {NIL: NIL}
+		stack = [self.root] if self.root != NIL else []
+		order = []
+		while stack:
+			x = stack.pop()
+			handles[x] = store.new(old.keys[x], old.values[x])
+			order.append(x)
+			for son in (old.left[x], old.right[x]):
+				if son != NIL:
+					stack.append(son)
+		for x in order:
+			y = handles[x]
+			store.left[y] = handles[old.left[x]]
+			store.right[y] = handles[old.right[x]]
+			store.parent[y] = handles[old.parent[x]]
+			store.height[y] = old.height[x]
+			store.size[y] = old.size[x]
+		self.store = store
+		self.root = handles[self.root]
+		self.Tmin = handles[self.Tmin]
+
+	"""@pre: if self is not empty - self.root.key < x.key < tree.root.key (tree also not empty)"""
+	def _join_by_node(self, tree, x):
+		h1 = self.tree_height()  # self is always the smaller-keys tree or empty
+		h2 = tree.tree_height()
+		if self.root == NIL:
+			if tree.root != NIL:
+				y = tree._search_closest(self.store.keys[x])
+				self._set_parent(x, y)
+				self._update_node(x)
+				tree._fix_after(y)
+				self.set_root(tree.root)
+				return h2 + 1
+			self.set_root(x)
+			tree.set_root(x)
+			self._update_node(x)
+			return 1
+
+		if h1 > h2:
+			tree._connect(self, x, h2, False)
+		else:
+			self._connect(tree, x, h1, True)
+
+		st = self.store
+		if st.left[x] != NIL:
+			self._update_node(st.left[x])
+		if st.right[x] != NIL:
+			self._update_node(st.right[x])
+		self._fix_after(x, None)
+		tree.set_root(self.root)
+		return abs(h1 - h2) + 1
+
+	"""@pre: self.height <= tree.height, see AVLTree.connect"""
+	def _connect(self, tree, x, h, left_join=True):
+		y = self._go_to_h(tree.root, h, left_join)
+		par = self.store.parent[y]
+		self._set_parent(y, x, True)
+		self._set_parent(self.root, x)
+		if par != NIL:
+			self._set_parent(x, par)
+			self.set_root(tree.root)
+		else:  # trees are at same height
+			self.set_root(x)
+			tree.set_root(x)
+		self._update_node(x)
+		self._update_node(self.root)
+
+	"""compute the rank of node in the self
+
+	@type node: ArrayAVLNode
+	@pre: node is in self
+	@rtype: int
+	"""
+	def rank(self, node):
+		x = self._handle(node)
+		left, right, parent, size = self.store.left, self.store.right, self.store.parent, self.store.size
+		r = size[left[x]] + 1
+		par = parent[x]
+		while par != NIL:
+			if x == right[par]:  # x is a right son
+				r += size[left[par]] + 1
+			x = par
+			par = parent[par]
+		return r
+
+	"""finds the i'th smallest item (according to keys) in self
+
+	@pre: 1 <= i <= self.size()
+	@rtype: ArrayAVLNode
+	"""
+	def select(self, i):
+		left, right, parent, size = self.store.left, self.store.right, self.store.parent, self.store.size
+		if size[left[self.root]] + 1 <= i:
+			x = self.root
+		else:  # climb from the minimum to the minimal subtree containing ranks {1,..i}
+			x = self.Tmin
+			while size[x] < i:
+				x = parent[x]
+		while x != NIL:
+			r = size[left[x]] + 1
+			if i == r:
+				break
+			elif i < r:
+				x = left[x]
+			else:
+				x = right[x]
+				i -= r
+		return self._view(x)
+
+	"""fixing after deletion/insertion, counts the number of steps"""
+	def _fix_after(self, y, insert=True):
+		parent, height = self.store.parent, self.store.height
+		total = self._update(y, insert)
+		cnt_h = 0
+		while y != NIL:
+			par = parent[y]
+			if abs(self._bf(y)) == 2:
+				if insert:
+					return cnt_h + self._rotation(y)  # stop after first rotation
+				h_diff = height[par] if par != NIL else 0
+				total += self._rotation(y)
+				if par != NIL:
+					h_diff -= height[par]
+				total += abs(h_diff)
+			else:
+				cnt_h += 1
+			if insert and cnt_h == total:  # stop if height hasn't changed
+				break
+			y = par
+		return total
+
+	"""infers & performs the needed rotation at x's level, @pre: |BF(x)| == 2"""
+	def _rotation(self, x):
+		st = self.store
+		cnt = 1
+		par = st.parent[x]
+		if self._bf(x) == 2:
+			l_son = st.left[x]
+			if self._bf(l_son) == -1:
+				cnt += 1
+				self._simple_rotate(l_son, True)
+			self._simple_rotate(x, False)
+		else:
+			r_son = st.right[x]
+			if self._bf(r_son) == 1:
+				cnt += 1
+				self._simple_rotate(r_son, False)
+			self._simple_rotate(x, True)
+		self._update(par)
+		return cnt
+
+	"""does a rotation to the left (left == True) or to the right (left == False)"""
+	def _simple_rotate(self, b, left):
+		st = self.store
+		a = st.right[b] if left else st.left[b]
+		par = st.parent[b]
+		if left:
+			if st.left[a] != NIL:
+				self._set_parent(st.left[a], b)
+			else:
+				self._virtual_son(b, False)
+		elif st.right[a] != NIL:
+			self._set_parent(st.right[a], b)
+		else:
+			self._virtual_son(b, True)
+		self._set_parent(b, a)
+		if self._set_parent(a, par):
+			self.set_root(a)
+		self._update_node(b)
+		self._update_node(a)
+
+	"""updates the tree nodes after operations, see AVLTree.update"""
+	def _update(self, x, operation=None):
+		st = self.store
+		parent, size = st.parent, st.size
+		cnt = 0
+		if x == NIL:  # if deleted node was root/empty tree was sent
+			if self.root == NIL:
+				return 0
+			return 1 if self._update_node(self.root) else 0
+		up_size = operation is None
+		i = 1 if operation else -1
+		while x != NIL:
+			if not up_size:
+				size[x] += i
+			if self._update_node(x, up_size):
+				cnt += 1  # x's height changed
+			x = parent[x]
+		return cnt
+
+	"""recomputes x's size & height, returns True if x's height changed"""
+	def _update_node(self, x, size=True):
+		st = self.store
+		l, r = st.left[x], st.right[x]
+		if size:
+			st.size[x] = 1 + st.size[l] + st.size[r]
+		curr = st.height[x]
+		h = 1 + max(st.height[l], st.height[r])
+		st.height[x] = h
+		return h != curr
+
+	def _bf(self, x):
+		st = self.store
+		return st.height[st.left[x]] - st.height[st.right[x]]
+
+	"""sets p as x's parent & x as p's son, returns True if x is now a root"""
+	def _set_parent(self, x, p, detach=False):
+		st = self.store
+		if detach and st.parent[x] != NIL:
+			self._virtual_son(x)
+		st.parent[x] = p
+		if p == NIL:
+			return True
+		if st.keys[x] > st.keys[p]:
+			st.right[p] = x
+		else:
+			st.left[p] = x
+		return False
+
+	"""sets the virtual node as x's son, see AVLNode.virtual_son"""
+	def _virtual_son(self, x, left=None):
+		st = self.store
+		if left is None:
+			par = st.parent[x]
+			if par == NIL:  # x is root
+				return True
+			left = (st.left[par] == x)
+		else:
+			par = x
+		if left:
+			st.left[par] = NIL
+		else:
+			st.right[par] = NIL
+		return None
+
+	def _successor(self, x):
+		st = self.store
+		if st.right[x] == NIL:
+			y = st.parent[x]
+			while y != NIL and x == st.right[y]:
+				x = y
+				y = st.parent[x]
+			return y
+		return self._go_to_h(st.right[x], -1, True)
+
+	"""see AVLNode.go_to_h"""
+	def _go_to_h(self, x, h, left):
+		st = self.store
+		sons, height = (st.left if left else st.right), st.height
+		while sons[x] != NIL and height[x] > h:
+			x = sons[x]
+		return x
@@ -0,0 +1,235 @@
+"""An asyncio wrapper of AVLTree whose bulk operations yield to the event loop
+
+bulk jobs visit at most step nodes (or items) between yields. jobs that rebuild the tree
+build the new version aside, block by block, and swap it in at the end, so reads keep being
+served from the current version - which no one changes - while the job runs. writes are
+serialized by a lock, so a point write waits for a running bulk job. a batch of at most
+step items is applied to the tree in place instead, like a point write.
+"""
+
+import asyncio
+
+from AVLTree import AVLTree, sort_items
+
+
+"""
+A class implementing a dictionary over an AVLTree for asyncio code.
+reads are the tree's own, synchronous methods (on self.tree). changes go through the
+coroutines of this class, so they are serialized with the bulk jobs.
+"""
+
+
+class AsyncAVLTree(object):
+
+	"""
+	Constructor.
+	@type tree: AVLTree
+	@param tree: the dictionary to wrap, a new one if None
+	@type step: int
+	@param step: the most nodes (or items) a bulk job visits between yields to the event loop
+	"""
+	def __init__(self, tree=None, step=1024):
+		self.tree = tree if tree is not None else AVLTree()
+		self.step = step
+		self.lock = asyncio.Lock()
+
+	"""returns the number of items in dictionary"""
+	def size(self):
+		return self.tree.size()
+
+	"""searches for a node in the dictionary corresponding to the key
+
+	@rtype: AVLNode
+	@returns: node corresponding to key, None if key is not in self
+	"""
+	def search(self, key):
+		return self.tree.search(key)
+
+	"""sets key's value, inserting key if it is missing, see AVLTree.upsert"""
+	async def upsert(self, key, val):
+		async with self.lock:
+			return self.tree.upsert(key, val)
+
+	"""deletes key, see AVLTree.delete_key"""
+	async def delete_key(self, key):
+		async with self.lock:
+			return self.tree.delete_key(key)
+
+	"""lists the items of tree in order of keys, yielding every step nodes.
+	@pre: tree doesn't change until the list is complete (hold the lock, or own tree)
+
+	@rtype: list
+	@returns: a sorted list of (key, value) tuples
+	"""
+	async def walk(self, tree):
+		lst = []
+		stack = []  # in-order walk without recursion, as AVLTree.avl_to_array
+		x = tree.get_root()
+		while stack or (x is not None and x.is_real_node()):
+			while x is not None and x.is_real_node():
+				stack.append(x)
+				x = x.get_left()
+			x = stack.pop()
+			lst.append((x.get_key(), x.get_value()))
+			x = x.get_right()
+			if len(lst) % self.step == 0:
+				await asyncio.sleep(0)
+		return lst
+
+	"""returns an array representing dictionary, yielding every step nodes
+
+	@rtype: list
+	@returns: a sorted list according to key of tuples (key, value)
+	"""
+	async def avl_to_array(self):
+		async with self.lock:
+			return await self.walk(self.tree)
+
+	"""builds a tree with self.tree's settings from sorted items, a block of step items at a
+	time: each block is built by build_sorted and joined on the right of the blocks before it
+
+	@type items: list
+	@pre: items are (key, value) pairs with strictly increasing keys
+	@rtype: AVLTree
+	"""
+	async def build(self, items):
+		tree = self.tree.spawn()
+		for i in range(0, len(items), self.step):
+			x = tree.make_node(items[i][0], items[i][1])  # the block's first item joins it
+			root = self.tree.build_sorted(items[i + 1:i + self.step])
+			block = self.tree.spawn(root if root.is_real_node() else None).update_min()
+			tree, cnt = AVLTree.join_trees(tree, x, block)
+			await asyncio.sleep(0)
+		return tree
+
+	"""merges two sorted item lists, yielding every step items
+
+	@type mode: str
+	@param mode: 'union', 'intersection' or 'difference' (the items of a whose key is not in b)
+	@type merge: function
+	@param merge: merge(a_val, b_val) gives the value of a key in both lists
+	@rtype: list
+	"""
+	async def merge_items(self, a, b, mode, merge):
+		res = []
+		i = j = 0
+		steps = 0  # i + j skips steps when both lists hold a key
+		while i < len(a) and j < len(b):
+			if a[i][0] < b[j][0]:
+				if mode != 'intersection':
+					res.append(a[i])
+				i += 1
+			elif b[j][0] < a[i][0]:
+				if mode == 'union':
+					res.append(b[j])
+				j += 1
+			else:
+				if mode != 'difference':
+					res.append((a[i][0], merge(a[i][1], b[j][1])))
+				i += 1
+				j += 1
+			steps += 1
+			if steps % self.step == 0:
+				await asyncio.sleep(0)
+		if mode != 'intersection':
+			res.extend(a[i:])
+		if mode == 'union':
+			res.extend(b[j:])
+		return res
+
+	"""merges self's items with other's into a new version and swaps it in.
+	walks and rebuilds the whole tree: O(n + k), for batches too big to apply at once
+
+	@type other: list
+	@param other: sorted (key, value) items
+	@returns: self
+	"""
+	async def rebuild(self, other, mode, merge=None):
+		async with self.lock:
+			items = await self.merge_items(await self.walk(self.tree), other, mode,
+											merge or (lambda val, other_val: val))
+			self.tree = await self.build(items)
+		return self
+
+	"""unwraps tree's items: an AVLTree or AsyncAVLTree, listed without blocking the loop"""
+	async def items_of(self, tree):
+		if isinstance(tree, AsyncAVLTree):
+			return await tree.avl_to_array()
+		return await self.walk(tree)
+
+	"""inserts a batch of items, keys already in self get the batch's value, see AVLTree.insert_many.
+	a batch of at most step items is applied to the tree in place, in O(k*log n) without yielding;
+	a larger one rebuilds the tree aside (see rebuild)
+
+	@type pairs: iterable
+	@param pairs: (key, value) pairs, in any order. for a repeated key the last value wins
+	@returns: self
+	"""
+	async def insert_many(self, pairs):
+		items = await asyncio.get_running_loop().run_in_executor(None, sort_items, pairs)
+		if len(items) <= self.step:
+			async with self.lock:
+				self.tree.insert_many(items)
+			return self
+		return await self.rebuild(items, 'union', lambda val, new: new)
+
+	"""deletes a batch of keys, keys not in self are ignored. small batches are applied in
+	place, see insert_many
+
+	@returns: self
+	"""
+	async def delete_many(self, keys):
+		items = await asyncio.get_running_loop().run_in_executor(None, sort_items, ((key, None) for key in keys))
+		if len(items) <= self.step:
+			async with self.lock:
+				self.tree.delete_many(key for key, val in items)
+			return self
+		return await self.rebuild(items, 'difference')
+
+	"""adds tree's items to self, see AVLTree.union
+
+	@type tree: AVLTree or AsyncAVLTree
+	@returns: self
+	"""
+	async def union(self, tree, merge=None):
+		return await self.rebuild(await self.items_of(tree), 'union', merge)
+
+	"""keeps in self only the keys that are also in tree, see AVLTree.intersection
+
+	@type tree: AVLTree or AsyncAVLTree
+	@returns: self
+	"""
+	async def intersection(self, tree, merge=None):
+		return await self.rebuild(await self.items_of(tree), 'intersection', merge)
+
+	"""removes from self every key that is in tree, see AVLTree.difference
+
+	@type tree: AVLTree or AsyncAVLTree
+	@returns: self
+	"""
+	async def difference(self, tree):
+		return await self.rebuild(await self.items_of(tree), 'difference')
+
+	"""splits the dictionary into pieces at bounds. piece i holds the keys k with
+	bounds[i-1] <= k < bounds[i]. the splits run without yielding: a tree being split can't be
+	read, and each split is only O(log n), O(b*log n) in all. so reads see the whole dictionary
+	until partition returns, and an empty one after it - the pieces take self's nodes
+
+	@type bounds: list
+	@param bounds: the keys to split at
+	@rtype: list
+	@returns: len(bounds) + 1 AsyncAVLTrees
+	"""
+	async def partition(self, bounds):
+		pieces = []
+		async with self.lock:
+			rest = self.tree
+			for bound in sorted(bounds, reverse=True):  # cut the largest keys off first
+				left, x, right = rest.split_key(bound)
+				if x is not None:
+					right.upsert(x.get_key(), x.get_value())
+				pieces.append(AsyncAVLTree(right, self.step))
+				rest = left
+			pieces.append(AsyncAVLTree(rest, self.step))
+			self.tree = self.tree.spawn()
+		return pieces[::-1]
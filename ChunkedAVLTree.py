@@ -0,0 +1,338 @@
+"""An AVL tree dictionary whose nodes hold sorted chunks of keys, like the leaves of a B+ tree"""
+
+from array import array
+from bisect import bisect_left
+
+from AVLTree import AVLNode, AVLTree
+
+
+"""
+A node of a ChunkIndex: a sorted chunk of keys with their values.
+the node's key is the chunk's first key, and its size counts the keys in its subtree
+(not the nodes), so rank & select by key position work on the chunks as they are
+"""
+
+
+class ChunkNode(AVLNode):
+	__slots__ = ('keys', 'vals')
+
+	"""
+	@type keys: list or array
+	@param keys: the chunk's keys, sorted, not empty
+	@type vals: list
+	@param vals: the values of keys
+	"""
+	def __init__(self, keys, vals):
+		AVLNode.__init__(self, keys[0], None)
+		self.keys, self.vals = keys, vals
+		self.size = len(keys)
+
+	"""updates height & size - the size is always recomputed from the chunks, since the
+	tree's +-1 size updates count nodes, not keys (see AVLNode.update_node)"""
+	def update_node(self, size=True, height=True):
+		self.size = len(self.keys) + self.left.size + self.right.size
+		return AVLNode.update_node(self, False, height)
+
+	"""adds n to the sizes from self up to the root"""
+	def add_to_path(self, n):
+		x = self
+		while x is not None:
+			x.size += n
+			x = x.parent
+		return None
+
+	"""recomputes the sizes from self up to the root"""
+	def refresh_path(self):
+		x = self
+		while x is not None:
+			x.update_node()
+			x = x.parent
+		return None
+
+
+"""
+The AVLTree of a ChunkedAVLTree's chunks, keyed by their first keys.
+make_node(key, (keys, vals)) makes a ChunkNode, so AVLTree's insert, split & join build chunks
+"""
+
+
+class ChunkIndex(AVLTree):
+
+	def make_node(self, key, chunk):
+		return ChunkNode(chunk[0], chunk[1])
+
+	def like(self, node=None):
+		return ChunkIndex(node)
+
+
+"""
+A class implementing a dictionary over an AVL tree of chunks.
+a chunk holds up to chunk keys. a chunk that overflows is halved into two nodes, a chunk
+that shrinks under chunk / 4 is merged with its successor. as there are no per-key nodes,
+keys are looked up, deleted and split at by key.
+"""
+
+
+class ChunkedAVLTree(object):
+
+	"""
+	Constructor.
+	@type chunk: int
+	@param chunk: the most keys a node holds
+	@type typecode: str
+	@param typecode: an array typecode (e.g. 'q') to keep the keys in typed arrays instead of
+	lists - no object per key, for keys that fit it. None for keys of any type
+	"""
+	def __init__(self, chunk=64, typecode=None):
+		self.chunk = chunk
+		self.typecode = typecode
+		self.index = ChunkIndex()
+
+	"""returns a new empty tree with self's settings"""
+	def spawn(self, index=None):
+		tree = ChunkedAVLTree(self.chunk, self.typecode)
+		if index is not None:
+			tree.index = index
+		return tree
+
+	"""returns keys as a chunk's key sequence"""
+	def key_seq(self, keys):
+		return list(keys) if self.typecode is None else array(self.typecode, keys)
+
+	"""builds a tree from items in O(n), with full chunks
+
+	@type items: iterable
+	@pre: items are (key, value) pairs with strictly increasing keys
+	@rtype: ChunkedAVLTree
+	"""
+	@classmethod
+	def from_sorted(cls, items, chunk=64, typecode=None):
+		tree = cls(chunk, typecode)
+		items = items if isinstance(items, list) else list(items)
+		chunks = []
+		for i in range(0, len(items), chunk):
+			part = items[i:i + chunk]
+			keys = tree.key_seq(key for key, val in part)
+			chunks.append((keys[0], (keys, [val for key, val in part])))
+		if chunks:
+			tree.index.set_root(tree.index.build_sorted(chunks))
+		tree.index.update_min()
+		return tree
+
+	"""returns the number of items in dictionary"""
+	def size(self):
+		root = self.index.get_root()
+		return 0 if root is None else root.size
+
+	"""returns the number of chunks, in O(number of chunks) - the index's sizes count keys,
+	not nodes (see ChunkNode)"""
+	def chunks(self):
+		cnt = 0
+		x = self.index.get_min()
+		while x is not None:
+			cnt += 1
+			x = x.get_successor()
+		return cnt
+
+	"""returns the height of the tree of chunks"""
+	def tree_height(self):
+		return self.index.tree_height()
+
+	"""returns the chunk key belongs in: the last chunk whose first key is <= key,
+	the first chunk if key is smaller than all. None if the dictionary is empty
+
+	@rtype: ChunkNode
+	"""
+	def chunk_of(self, key):
+		x = self.index.get_root()
+		y = None
+		while x is not None and x.is_real_node():
+			if key < x.key:
+				x = x.left
+			elif key <= x.keys[-1]:
+				return x
+			else:
+				y = x
+				x = x.right
+		return y if y is not None else self.index.get_min()
+
+	"""searches for key in the dictionary
+
+	@rtype: tuple
+	@returns: the item (key, value), None if key is not in self
+	"""
+	def search(self, key):
+		x = self.chunk_of(key)
+		if x is None:
+			return None
+		i = bisect_left(x.keys, key)
+		if i < len(x.keys) and x.keys[i] == key:
+			return key, x.vals[i]
+		return None
+
+	"""returns key's value, default if key is not in self"""
+	def get(self, key, default=None):
+		item = self.search(key)
+		return default if item is None else item[1]
+
+	"""inserts val to the dictionary. a full chunk is halved into two nodes
+
+	@rtype: int
+	@returns: the number of rebalancing operations (only a chunk split rebalances)
+	@raises KeyError: if key is already in the dictionary
+	"""
+	def insert(self, key, val):
+		x = self.chunk_of(key)
+		if x is None:
+			self.index.insert(key, (self.key_seq([key]), [val]))
+			return 0
+		i = bisect_left(x.keys, key)
+		if i < len(x.keys) and x.keys[i] == key:
+			raise KeyError("key %r is already in the tree" % (key,))
+		x.keys.insert(i, key)
+		x.vals.insert(i, val)
+		x.key = x.keys[0]
+		x.add_to_path(1)
+		if len(x.keys) <= self.chunk:
+			return 0
+		half = len(x.keys) // 2
+		keys, vals = x.keys[half:], x.vals[half:]
+		del x.keys[half:]
+		del x.vals[half:]
+		x.add_to_path(-len(keys))
+		return self.index.insert(keys[0], (keys, vals))
+
+	"""deletes key from the dictionary. a chunk that gets too small is merged with its successor
+
+	@rtype: int
+	@returns: the number of rebalancing operations (only a chunk removal rebalances)
+	@raises KeyError: if key is not in the dictionary
+	"""
+	def delete_key(self, key):
+		x = self.chunk_of(key)
+		i = -1 if x is None else bisect_left(x.keys, key)
+		if i < 0 or i == len(x.keys) or x.keys[i] != key:
+			raise KeyError(key)
+		del x.keys[i]
+		del x.vals[i]
+		x.add_to_path(-1)
+		if not x.keys:
+			return self.index.delete(x)
+		x.key = x.keys[0]
+		if len(x.keys) >= self.chunk // 4:
+			return 0
+		suc = x.get_successor()
+		if suc is None or len(x.keys) + len(suc.keys) > self.chunk:
+			return 0
+		x.keys.extend(suc.keys)
+		x.vals.extend(suc.vals)
+		cnt = self.index.delete(suc)
+		x.refresh_path()
+		return cnt
+
+	"""deletes key from the dictionary and returns its value
+
+	@raises KeyError: if key is missing and no default was given
+	"""
+	def pop(self, key, *default):
+		item = self.search(key)
+		if item is None:
+			if default:
+				return default[0]
+			raise KeyError(key)
+		self.delete_key(key)
+		return item[1]
+
+	"""compute the rank of key in self, in one descent
+
+	@rtype: int
+	@returns: the rank of key in self, None if key is not in self
+	"""
+	def rank(self, key):
+		r = 0
+		x = self.index.get_root()
+		while x is not None and x.is_real_node():
+			if key < x.key:
+				x = x.left
+			elif key > x.keys[-1]:
+				r += x.left.size + len(x.keys)
+				x = x.right
+			else:
+				i = bisect_left(x.keys, key)
+				if x.keys[i] != key:
+					return None
+				return r + x.left.size + i + 1
+		return None
+
+	"""finds the i'th smallest item (according to keys) in self
+
+	@pre: 1 <= i <= self.size()
+	@rtype: tuple
+	@returns: the item (key, value) of rank i
+	"""
+	def select(self, i):
+		x = self.index.get_root()
+		while x is not None and x.is_real_node():
+			left = x.left.size
+			if i <= left:
+				x = x.left
+			elif i <= left + len(x.keys):
+				return x.keys[i - left - 1], x.vals[i - left - 1]
+			else:
+				i -= left + len(x.keys)
+				x = x.right
+		return None
+
+	"""returns an array representing dictionary, a sorted list of (key, value) tuples"""
+	def avl_to_array(self):
+		lst = []
+		x = self.index.get_min()
+		while x is not None:
+			lst.extend(zip(x.keys, x.vals))
+			x = x.get_successor()
+		return lst
+
+	"""iterates over the (key, value) items of the dictionary, in order of keys"""
+	def items(self):
+		x = self.index.get_min()
+		while x is not None:
+			yield from zip(x.keys, x.vals)
+			x = x.get_successor()
+
+	"""splits the dictionary at key: the chunk holding key is cut in two and the tree of
+	chunks is split at it, O(log n + chunk)
+
+	@rtype: list
+	@returns: [left, right], ChunkedAVLTrees with the keys smaller / larger than key
+	"""
+	def split(self, key):
+		x = self.chunk_of(key)
+		if x is None:
+			return [self.spawn(), self.spawn()]
+		i = bisect_left(x.keys, key)
+		j = i + 1 if i < len(x.keys) and x.keys[i] == key else i
+		low = (x.keys[:i], x.vals[:i])
+		high = (x.keys[j:], x.vals[j:])
+		left, right = self.index.split(x, False)
+		if low[0]:
+			left.insert_under(left.get_max(), low[0][0], low)
+		if high[0]:
+			right.insert_under(right.get_min(), high[0][0], high)
+		return [self.spawn(left), self.spawn(right)]
+
+	"""joins self with key and another ChunkedAVLTree, both trees hold the joined dictionary
+
+	@pre: all keys in self are smaller than key and all keys in tree are larger than key,
+	or the other way around.
+	@rtype: int
+	@returns: the absolute value of the difference between the height of the trees of chunks joined
+	"""
+	def join(self, tree, key, val):
+		h_diff = abs(self.tree_height() - tree.tree_height()) + 1
+		left, right = self, tree
+		if (left.size() and left.index.get_min().key > key) or (right.size() and right.index.get_max().keys[-1] < key):
+			left, right = right, left
+		left.insert(key, val)  # key goes into left's last chunk
+		index, cnt = AVLTree.join_trees2(left.index, right.index)
+		self.index = tree.index = index
+		return h_diff
@@ -0,0 +1,249 @@
+"""An AVL tree dictionary made durable by a write-ahead log and snapshots
+
+every change is journaled to an append-only log as it is applied - once the tree has accepted
+it, so a change the tree rejects is never logged. the log is written
+and fsync'd in groups (group commit): a group is flushed once it holds group_size records,
+or group_delay seconds after its first record, whichever comes first. checkpoint dumps the
+whole tree (see AVLTree.dump) and empties the log. on open, the last snapshot is loaded and
+the log replayed on top of it in one batch (see AVLTree.insert_many / delete_many).
+"""
+
+import os
+import pickle
+import struct
+import threading
+import zlib
+
+from AVLTree import AVLTree
+
+
+SNAPSHOT_FILE = 'snapshot.avl'
+LOG_FILE = 'wal.log'
+LOG_RECORD = struct.Struct('<II')  # length & crc32 of the pickled (op, key, value) that follows
+INSERT = 'i'
+DELETE = 'd'
+
+
+"""fsyncs a directory, so a file created, renamed or truncated in it survives a crash"""
+def fsync_dir(path):
+	fd = os.open(path, os.O_RDONLY)
+	try:
+		os.fsync(fd)
+	finally:
+		os.close(fd)
+
+
+"""encodes one log record"""
+def pack_record(op, key, val=None):
+	data = pickle.dumps((op, key, val), pickle.HIGHEST_PROTOCOL)
+	return LOG_RECORD.pack(len(data), zlib.crc32(data)) + data
+
+
+"""reads the records of a log. reading stops at the first torn or corrupt record,
+which can only be the tail of a group that was being written during a crash
+
+@rtype: (list, int)
+@returns: the (op, key, value) records and the length of the log's valid prefix
+"""
+def read_log(path):
+	try:
+		with open(path, 'rb') as f:
+			data = f.read()
+	except FileNotFoundError:
+		return [], 0
+	records = []
+	off = 0
+	while off + LOG_RECORD.size <= len(data):
+		length, crc = LOG_RECORD.unpack_from(data, off)
+		start = off + LOG_RECORD.size
+		body = data[start:start + length]
+		if len(body) < length or zlib.crc32(body) != crc:
+			break
+		records.append(pickle.loads(body))
+		off = start + length
+	return records, off
+
+
+"""
+A class implementing a durable dictionary over an AVLTree.
+changes go through the methods of this class, which journal them; reads may use self.tree
+directly. a change is durable once the group holding it is committed - call commit to wait
+for that. writers are serialized by a lock, so threads may share one DurableAVLTree.
+snapshots are written by AVLTree.dump, so keys must be ints that fit in 64 bits: the log takes
+any picklable key, but checkpoint raises ValueError on a tree holding any other key.
+"""
+
+
+class DurableAVLTree(object):
+
+	"""
+	Constructor. opens (or creates) the dictionary stored in directory path
+
+	@type path: str
+	@param path: the directory holding the snapshot and the log
+	@type group_size: int
+	@param group_size: the number of records that makes a group commit, 1 to fsync every change
+	@type group_delay: float
+	@param group_delay: seconds after which a group is committed even if it is not full, None to wait
+	for group_size records (or an explicit commit)
+	@type aggregates: dict
+	@param aggregates: as in AVLTree's constructor
+	"""
+	def __init__(self, path, group_size=64, group_delay=0.01, aggregates=None):
+		self.path = path
+		self.group_size = group_size
+		self.group_delay = group_delay
+		self.lock = threading.RLock()
+		self.pending = []  # encoded records not yet written to the log
+		self.timer = None
+		os.makedirs(path, exist_ok=True)
+		self.tree = self.recover(aggregates)
+		self.log = open(os.path.join(path, LOG_FILE), 'ab')
+
+	"""loads the snapshot and replays the log over it, cutting off a torn tail of the log
+
+	@rtype: AVLTree
+	"""
+	def recover(self, aggregates=None):
+		snapshot = os.path.join(self.path, SNAPSHOT_FILE)
+		if os.path.exists(snapshot):
+			tree = AVLTree.load(snapshot, aggregates)
+		else:
+			tree = AVLTree(None, aggregates)
+		log = os.path.join(self.path, LOG_FILE)
+		records, valid = read_log(log)
+		if os.path.exists(log) and valid < os.path.getsize(log):
+			with open(log, 'r+b') as f:
+				f.truncate(valid)
+				os.fsync(f.fileno())
+		self.replay(tree, records)
+		return tree
+
+	"""applies log records to tree in one batch. only the last record of a key matters,
+	so the records are collapsed per key and applied with one insert_many and one delete_many
+
+	@rtype: int
+	@returns: the number of rebalancing operations
+	"""
+	@staticmethod
+	def replay(tree, records):
+		last = {}
+		for op, key, val in records:
+			last[key] = (op, val)
+		inserts = [(key, val) for key, (op, val) in last.items() if op == INSERT]
+		deletes = [key for key, (op, val) in last.items() if op == DELETE]
+		return tree.insert_many(inserts) + tree.delete_many(deletes)
+
+	"""adds records to the current group, committing the group if it is full"""
+	def journal(self, records):
+		with self.lock:
+			self.pending.extend(records)
+			if len(self.pending) >= self.group_size:
+				self.commit()
+			elif self.timer is None and self.group_delay is not None:
+				self.timer = threading.Timer(self.group_delay, self.commit)
+				self.timer.daemon = True
+				self.timer.start()
+
+	"""writes the current group to the log and fsyncs it. on return every change made
+	so far is durable"""
+	def commit(self):
+		with self.lock:
+			if self.timer is not None:
+				self.timer.cancel()
+				self.timer = None
+			if not self.pending or self.log.closed:
+				return
+			self.log.write(b''.join(self.pending))
+			self.log.flush()
+			os.fsync(self.log.fileno())
+			self.pending = []
+
+	"""writes a snapshot of the tree and empties the log, so the next open replays nothing.
+	the snapshot is written aside and renamed over the old one, so a crash at any point
+	leaves a snapshot and a log that together hold every committed change
+
+	@raises ValueError: if a key is not a 64 bit int (see AVLTree.dump) - nothing is changed then
+	"""
+	def checkpoint(self):
+		with self.lock:
+			self.commit()
+			snapshot = os.path.join(self.path, SNAPSHOT_FILE)
+			self.tree.dump(snapshot + '.tmp')
+			with open(snapshot + '.tmp', 'rb') as f:
+				os.fsync(f.fileno())
+			os.replace(snapshot + '.tmp', snapshot)
+			fsync_dir(self.path)
+			self.log.truncate(0)  # replaying the log over the new snapshot would change nothing
+			os.fsync(self.log.fileno())
+
+	"""commits the current group and closes the log"""
+	def close(self):
+		with self.lock:
+			self.commit()
+			self.log.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	"""returns the number of items in dictionary"""
+	def size(self):
+		return self.tree.size()
+
+	"""searches for a node in the dictionary corresponding to the key
+
+	@rtype: AVLNode
+	@returns: node corresponding to key, None if key is not in self
+	"""
+	def search(self, key):
+		return self.tree.search(key)
+
+	"""returns an array representing dictionary, a sorted list of (key, value) tuples"""
+	def avl_to_array(self):
+		return self.tree.avl_to_array()
+
+	"""inserts val to the dictionary & journals it. the tree goes first, so an insert it
+	rejects is never logged (and never replayed)
+
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	@raises KeyError: if key is already in the dictionary
+	"""
+	def insert(self, key, val):
+		with self.lock:
+			cnt = self.tree.insert(key, val)
+			self.journal([pack_record(INSERT, key, val)])
+			return cnt
+
+	"""deletes node from the dictionary & journals it, see insert
+
+	@type node: AVLNode
+	@pre: node is a real pointer to a node in self
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	"""
+	def delete(self, node):
+		with self.lock:
+			key = node.get_key()  # node may be recycled by the tree's NodePool
+			cnt = self.tree.delete(node)
+			self.journal([pack_record(DELETE, key)])
+			return cnt
+
+	"""inserts a batch of items & journals it, see AVLTree.insert_many and insert"""
+	def insert_many(self, pairs):
+		pairs = list(pairs)
+		with self.lock:
+			cnt = self.tree.insert_many(pairs)
+			self.journal([pack_record(INSERT, key, val) for key, val in pairs])
+			return cnt
+
+	"""deletes a batch of keys & journals it, see AVLTree.delete_many and insert"""
+	def delete_many(self, keys):
+		keys = list(keys)
+		with self.lock:
+			cnt = self.tree.delete_many(keys)
+			self.journal([pack_record(DELETE, key) for key in keys])
+			return cnt
@@ -0,0 +1,70 @@
+"""An interval tree: an AVLTree of intervals keyed by start, augmented with the subtree's max end"""
+
+from AVLTree import AVLTree, Monoid
+
+
+"""
+A class implementing an interval tree over AVLTree.
+every item is an interval: its key gives the start and its value the end (by default the key
+is the start and the value is the end). each node keeps the largest end in its subtree as an
+aggregate (see AugmentedAVLNode), which rotations, joins and splits keep up to date, so
+insert, delete, split & join are AVLTree's own and overlap queries prune every subtree that
+ends before the query starts. intervals are closed: [start, end].
+to keep several intervals with the same start, key them by (start, id) and pass
+start=lambda key: key[0].
+"""
+
+
+class IntervalTree(AVLTree):
+
+	"""
+	Constructor.
+	@type aggregates: dict
+	@param aggregates: more aggregates to keep, as in AVLTree's constructor
+	@type end: function
+	@param end: end(value) gives an interval's end, the value itself if None
+	@type start: function
+	@param start: start(key) gives an interval's start, the key itself if None
+	"""
+	def __init__(self, node=None, aggregates=None, end=None, start=None):
+		self.end = end if end is not None else (lambda value: value)
+		self.start = start if start is not None else (lambda key: key)
+		self.extra = aggregates
+		aggs = {'max_end': Monoid(max, float('-inf'), self.end)}  # first, so it is agg[0]
+		aggs.update(aggregates or {})
+		AVLTree.__init__(self, node, aggs)
+
+	def like(self, node=None):
+		return IntervalTree(node, self.extra, self.end, self.start)
+
+	"""returns the largest end of all intervals, -inf if the tree is empty"""
+	def max_end(self):
+		return float('-inf') if self.root is None else self.root.agg[0]
+
+	"""iterates over the intervals that overlap [lo, hi], in order of keys.
+	an in-order walk that skips subtrees whose max end is < lo and stops at the first start > hi:
+	O((k + 1) * log n) for k results. the tree must not change while iterating
+
+	@rtype: generator
+	@returns: the (key, value) items of the overlapping intervals
+	"""
+	def overlap(self, lo, hi):
+		start, end = self.start, self.end
+		stack = []
+		x = self.root
+		while True:
+			while x is not None and x.is_real_node() and x.agg[0] >= lo:
+				stack.append(x)
+				x = x.left
+			if not stack:
+				return
+			x = stack.pop()
+			if start(x.key) > hi:  # so is every later start
+				return
+			if end(x.value) >= lo:
+				yield x.key, x.value
+			x = x.right
+
+	"""iterates over the intervals that hold point, in order of keys, see overlap"""
+	def stab(self, point):
+		return self.overlap(point, point)
@@ -0,0 +1,326 @@
+"""A persistent (copy-on-write) AVL tree
+
+nodes are never changed once created: insert, delete, split and join copy only the
+nodes on the path they touch and share every other subtree with the older versions.
+so a version, once read from PersistentAVLTree.root, stays valid forever, and readers
+need no lock - they only need the writers to be serialized among themselves.
+"""
+
+
+"""
+A class representing an immutable node of a PersistentAVLTree.
+nodes have no parent (a shared subtree has many), a missing son is None
+"""
+
+
+class PersistentNode(object):
+	__slots__ = ('key', 'value', 'left', 'right', 'height', 'size')
+
+	def __init__(self, key, value, left=None, right=None):
+		self.key, self.value, self.left, self.right = key, value, left, right
+		self.height = 1 + max(height(left), height(right))
+		self.size = 1 + size(left) + size(right)
+
+	def get_key(self):
+		return self.key
+
+	def get_value(self):
+		return self.value
+
+	"""@returns: the left son, None if there is none"""
+	def get_left(self):
+		return self.left
+
+	"""@returns: the right son, None if there is none"""
+	def get_right(self):
+		return self.right
+
+	def get_height(self):
+		return self.height
+
+	def get_size(self):
+		return self.size
+
+	def is_real_node(self):
+		return True
+
+
+"""height of a subtree, -1 if empty"""
+def height(x):
+	return -1 if x is None else x.height
+
+
+"""size of a subtree, 0 if empty"""
+def size(x):
+	return 0 if x is None else x.size
+
+
+"""builds the node (key, val, left, right) fixing a height difference of 2 by rotating
+
+@rtype: (PersistentNode, int)
+@returns: the new subtree and the number of rotations
+"""
+def balance(key, val, left, right):
+	if height(left) > height(right) + 1:
+		if height(left.left) >= height(left.right):
+			return PersistentNode(left.key, left.value, left.left,
+								PersistentNode(key, val, left.right, right)), 1
+		lr = left.right
+		return PersistentNode(lr.key, lr.value, PersistentNode(left.key, left.value, left.left, lr.left),
+							PersistentNode(key, val, lr.right, right)), 2
+	if height(right) > height(left) + 1:
+		if height(right.right) >= height(right.left):
+			return PersistentNode(right.key, right.value,
+								PersistentNode(key, val, left, right.left), right.right), 1
+		rl = right.left
+		return PersistentNode(rl.key, rl.value, PersistentNode(key, val, left, rl.left),
+							PersistentNode(right.key, right.value, rl.right, right.right)), 2
+	return PersistentNode(key, val, left, right), 0
+
+
+"""@returns: (new subtree, rotations), key's value is replaced if key is already in x"""
+def insert(x, key, val):
+	if x is None:
+		return PersistentNode(key, val), 0
+	if key == x.key:
+		return PersistentNode(key, val, x.left, x.right), 0
+	if key < x.key:
+		left, cnt = insert(x.left, key, val)
+		x, c = balance(x.key, x.value, left, x.right)
+	else:
+		right, cnt = insert(x.right, key, val)
+		x, c = balance(x.key, x.value, x.left, right)
+	return x, cnt + c
+
+
+"""@returns: (new subtree, rotations, (key, value) of the removed minimum)"""
+def pop_min(x):
+	if x.left is None:
+		return x.right, 0, (x.key, x.value)
+	left, cnt, item = pop_min(x.left)
+	x, c = balance(x.key, x.value, left, x.right)
+	return x, cnt + c, item
+
+
+"""@returns: (new subtree, rotations, True if key was found) - x itself if key is not in x"""
+def delete(x, key):
+	if x is None:
+		return None, 0, False
+	if key < x.key:
+		left, cnt, found = delete(x.left, key)
+		if not found:
+			return x, 0, False
+		x, c = balance(x.key, x.value, left, x.right)
+	elif key > x.key:
+		right, cnt, found = delete(x.right, key)
+		if not found:
+			return x, 0, False
+		x, c = balance(x.key, x.value, x.left, right)
+	else:
+		if x.left is None or x.right is None:
+			return (x.right if x.left is None else x.left), 0, True
+		right, cnt, (suc_key, suc_val) = pop_min(x.right)
+		x, c = balance(suc_key, suc_val, x.left, right)
+	return x, cnt + c, True
+
+
+"""joins left, (key, val), right of any heights, @pre: left.keys < key < right.keys
+
+@rtype: (PersistentNode, int)
+@returns: the new subtree and the number of rotations
+"""
+def join(left, key, val, right):
+	if height(left) > height(right) + 1:
+		new_right, cnt = join(left.right, key, val, right)
+		x, c = balance(left.key, left.value, left.left, new_right)
+		return x, cnt + c
+	if height(right) > height(left) + 1:
+		new_left, cnt = join(left, key, val, right.left)
+		x, c = balance(right.key, right.value, new_left, right.right)
+		return x, cnt + c
+	return PersistentNode(key, val, left, right), 0
+
+
+"""@returns: (subtree of keys < key, key's node or None, subtree of keys > key)"""
+def split(x, key):
+	if x is None:
+		return None, None, None
+	if key == x.key:
+		return x.left, x, x.right
+	if key < x.key:
+		left, node, right = split(x.left, key)
+		return left, node, join(right, x.key, x.value, x.right)[0]
+	left, node, right = split(x.right, key)
+	return join(x.left, x.key, x.value, left)[0], node, right
+
+
+"""iterates over the (key, value) items of the subtree of x, in order of keys"""
+def iter_items(x):
+	stack = []
+	while stack or x is not None:
+		while x is not None:
+			stack.append(x)
+			x = x.left
+		x = stack.pop()
+		yield x.key, x.value
+		x = x.right
+
+
+"""
+A class implementing a persistent AVL tree, with the interface of AVLTree.
+every change builds a new version and publishes it with a single assignment to self.root
+"""
+
+
+class PersistentAVLTree(object):
+
+	"""
+	Constructor.
+	@type root: PersistentNode
+	@param root: the version to start from, None for an empty tree
+	"""
+	def __init__(self, root=None):
+		self.root = root
+
+	"""returns a tree holding the current version, in O(1).
+	later changes to self don't affect it, so it can be read without any lock
+
+	@rtype: PersistentAVLTree
+	"""
+	def snapshot(self):
+		return PersistentAVLTree(self.root)
+
+	"""returns the root of the current version, None if the dictionary is empty"""
+	def get_root(self):
+		return self.root
+
+	"""returns the number of items in dictionary"""
+	def size(self):
+		return size(self.root)
+
+	"""returns tree's height"""
+	def tree_height(self):
+		return height(self.root)
+
+	"""returns the node of the minimal key, None if the dictionary is empty"""
+	def get_min(self):
+		x = self.root
+		while x is not None and x.left is not None:
+			x = x.left
+		return x
+
+	"""returns the node of the maximal key, None if the dictionary is empty"""
+	def get_max(self):
+		x = self.root
+		while x is not None and x.right is not None:
+			x = x.right
+		return x
+
+	"""searches for a node in the dictionary corresponding to the key
+
+	@type key: int
+	@rtype: PersistentNode
+	@returns: node corresponding to key, None if key is not in self
+	"""
+	def search(self, key):
+		x = self.root
+		while x is not None:
+			if key == x.key:
+				return x
+			x = x.left if key < x.key else x.right
+		return None
+
+	"""inserts val to the dictionary, as a new version. an existing key gets the new value
+
+	@rtype: int
+	@returns: the number of rotations
+	"""
+	def insert(self, key, val):
+		self.root, cnt = insert(self.root, key, val)
+		return cnt
+
+	"""deletes node's key from the dictionary, as a new version
+
+	@type node: PersistentNode
+	@param node: a node of (some version of) self
+	@rtype: int
+	@returns: the number of rotations
+	"""
+	def delete(self, node):
+		self.root, cnt, found = delete(self.root, node.key)
+		return cnt
+
+	"""returns an array representing dictionary
+
+	@rtype: list
+	@returns: a sorted list according to key of tuples (key, value)
+	"""
+	def avl_to_array(self):
+		return list(self.items())
+
+	"""iterates over the (key, value) items of the version current when called, in order of keys"""
+	def items(self):
+		return iter_items(self.root)
+
+	"""splits the dictionary at a given node. self is not changed
+
+	@type node: PersistentNode
+	@rtype: list
+	@returns: a list [left, right] of PersistentAVLTrees with the keys smaller / larger than node.key
+	"""
+	def split(self, node):
+		left, mid, right = split(self.root, node.key)
+		return [PersistentAVLTree(left), PersistentAVLTree(right)]
+
+	"""joins self with key and another PersistentAVLTree, both trees hold the joined version
+
+	@pre: all keys in self are smaller than key and all keys in tree are larger than key,
+	or the other way around.
+	@rtype: int
+	@returns: the absolute value of the difference between the height of the AVL trees joined
+	"""
+	def join(self, tree, key, val):
+		h_diff = abs(self.tree_height() - tree.tree_height()) + 1
+		left, right = self.root, tree.root
+		if (left is not None and left.key > key) or (right is not None and right.key < key):
+			left, right = right, left  # self holds the larger keys
+		self.root = join(left, key, val, right)[0]
+		tree.root = self.root
+		return h_diff
+
+	"""compute the rank of node in the self
+
+	@type node: PersistentNode
+	@pre: node's key is in self
+	@rtype: int
+	"""
+	def rank(self, node):
+		r = 0
+		x = self.root
+		while x is not None:
+			if node.key < x.key:
+				x = x.left
+			else:
+				r += size(x.left) + 1
+				if node.key == x.key:
+					return r
+				x = x.right
+		return None
+
+	"""finds the i'th smallest item (according to keys) in self
+
+	@pre: 1 <= i <= self.size()
+	@rtype: PersistentNode
+	"""
+	def select(self, i):
+		x = self.root
+		while x is not None:
+			r = size(x.left) + 1
+			if i == r:
+				return x
+			elif i < r:
+				x = x.left
+			else:
+				x = x.right
+				i -= r
+		return None
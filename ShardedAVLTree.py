@@ -0,0 +1,214 @@
+"""An AVL tree dictionary partitioned by key range into several AVLTree shards"""
+
+from bisect import bisect_right
+
+from AVLTree import AVLTree, sort_items
+
+
+"""
+A class implementing a dictionary over key-range shards.
+shard i holds the keys k with bounds[i-1] <= k < bounds[i]. a shard that grows beyond
+max_shard keys is split in two at its median, a shard that shrinks under max_shard / 4
+is joined into its neighbour. global rank & select are computed from the shards' sizes.
+"""
+
+
+class ShardedAVLTree(object):
+
+	"""
+	Constructor.
+	@type max_shard: int
+	@param max_shard: the largest size a shard may reach before it is split
+	"""
+	def __init__(self, max_shard=1 << 16):
+		self.shards = [AVLTree()]
+		self.bounds = []
+		self.max_shard = max_shard
+
+	"""returns the index of the shard that holds (or would hold) key"""
+	def shard_of(self, key):
+		return bisect_right(self.bounds, key)
+
+	"""returns the number of items in dictionary"""
+	def size(self):
+		return sum(shard.size() for shard in self.shards)
+
+	"""searches for a node in the dictionary corresponding to the key
+
+	@rtype: AVLNode
+	@returns: node corresponding to key, None if key is not in self
+	"""
+	def search(self, key):
+		return self.shards[self.shard_of(key)].search(key)
+
+	"""inserts val to the dictionary, splitting the shard if it gets too large
+
+	@pre: key currently does not appear in the dictionary
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	"""
+	def insert(self, key, val):
+		i = self.shard_of(key)
+		cnt = self.shards[i].insert(key, val)
+		self.fit_shard(i)
+		return cnt
+
+	"""deletes node from the dictionary, joining the shard into a neighbour if it gets too small
+
+	@type node: AVLNode
+	@pre: node is a real pointer to a node in self
+	@rtype: int
+	@returns: the number of rebalancing operation due to AVL rebalancing
+	"""
+	def delete(self, node):
+		i = self.shard_of(node.get_key())
+		cnt = self.shards[i].delete(node)
+		if self.shards[i].size() < self.max_shard // 4 and len(self.shards) > 1:
+			self.merge_shards(i if i + 1 < len(self.shards) else i - 1)
+		return cnt
+
+	"""compute the rank of node in self
+
+	@type node: AVLNode
+	@pre: node is in self
+	@rtype: int
+	"""
+	def rank(self, node):
+		i = self.shard_of(node.get_key())
+		return sum(shard.size() for shard in self.shards[:i]) + self.shards[i].rank(node)
+
+	"""finds the i'th smallest item (according to keys) in self
+
+	@pre: 1 <= i <= self.size()
+	@rtype: AVLNode
+	"""
+	def select(self, i):
+		for shard in self.shards:
+			if i <= shard.size():
+				return shard.select(i)
+			i -= shard.size()
+		return None
+
+	"""counts the keys with lo <= key <= hi, see AVLTree.count_range"""
+	def count_range(self, lo=None, hi=None):
+		first = 0 if lo is None else self.shard_of(lo)
+		last = len(self.shards) - 1 if hi is None else self.shard_of(hi)
+		if first > last:  # lo > hi
+			return 0
+		if first == last:
+			return self.shards[first].count_range(lo, hi)
+		return max(0, self.shards[first].count_range(lo, None) + self.shards[last].count_range(None, hi) +
+					sum(shard.size() for shard in self.shards[first + 1:last]))
+
+	"""returns an array representing dictionary, a sorted list of (key, value) tuples"""
+	def avl_to_array(self):
+		lst = []
+		for shard in self.shards:
+			lst.extend(shard.avl_to_array())
+		return lst
+
+	"""splits shard i in two at its median key"""
+	def split_shard(self, i):
+		shard = self.shards[i]
+		mid = shard.select(shard.size() // 2 + 1)
+		key, val = mid.get_key(), mid.get_value()
+		left, right = shard.split(mid)
+		right.insert(key, val)
+		self.shards[i:i + 1] = [left, right]
+		self.bounds.insert(i, key)
+
+	"""halves shard i until every piece has at most max_shard keys
+
+	@rtype: int
+	@returns: the number of pieces
+	"""
+	def fit_shard(self, i):
+		if self.shards[i].size() <= self.max_shard:
+			return 1
+		self.split_shard(i)
+		pieces = self.fit_shard(i + 1)  # the right half first, so i stays the left half's index
+		return self.fit_shard(i) + pieces
+
+	"""joins shards i & i+1 into one, re-splitting it if it is too large"""
+	def merge_shards(self, i):
+		left, right = self.shards[i], self.shards[i + 1]
+		if right.size() == 0:
+			tree = left
+		elif left.size() == 0:
+			tree = right
+		else:
+			x = right.get_min()  # the separating key for join
+			key, val = x.get_key(), x.get_value()
+			right.delete(x)
+			left.join(right, key, val)
+			tree = left
+		self.shards[i:i + 2] = [tree]
+		self.bounds.pop(i)
+		self.fit_shard(i)
+
+	"""groups a sorted-by-key list of requests by shard
+
+	@rtype: list
+	@returns: [(shard index, [requests])], in order of shards
+	"""
+	def group(self, requests, key=lambda request: request):
+		groups = []
+		for request in requests:
+			i = self.shard_of(key(request))
+			if not groups or groups[-1][0] != i:
+				groups.append((i, []))
+			groups[-1][1].append(request)
+		return groups
+
+	"""loads many items at once: the items are partitioned by shard, each partition is
+	sorted (in executor's workers if given) and merged into its shard in one pass.
+	shards that grow too large are split afterwards
+
+	@type items: iterable
+	@param items: (key, value) pairs, in any order. for a repeated key the last value wins
+	@type executor: concurrent.futures.Executor
+	@param executor: a ProcessPoolExecutor to sort the partitions in parallel, None to sort here
+	"""
+	def bulk_load(self, items, executor=None):
+		parts = [[] for shard in self.shards]
+		for item in items:
+			parts[self.shard_of(item[0])].append(item)
+		if executor is None:
+			parts = [sort_items(part) for part in parts]
+		else:
+			parts = list(executor.map(sort_items, parts))
+		for i in range(len(parts) - 1, -1, -1):  # backwards - splitting shifts the later shards
+			if not parts[i]:
+				continue
+			if self.shards[i].size() == 0:
+				self.shards[i] = AVLTree.from_sorted(parts[i])
+			else:
+				self.shards[i].insert_many(parts[i])
+			self.fit_shard(i)
+
+	"""looks many keys up, shard by shard: each shard gets its keys as one batch (see
+	AVLTree.search_many). the shards are searched here - a process pool would need a copy of
+	every shard it searches, which costs far more than the lookups
+
+	@type keys: list
+	@param keys: the keys to look up
+	@rtype: list
+	@returns: the values of keys, in keys' order, None for keys not in self
+	"""
+	def search_many(self, keys):
+		order = sorted(range(len(keys)), key=lambda j: keys[j])
+		groups = self.group(order, key=lambda j: keys[j])
+		res = [None] * len(keys)
+		for i, js in groups:
+			vals = self.shards[i].search_many([keys[j] for j in js])
+			for j, val in zip(js, vals):
+				res[j] = val
+		return res
+
+	"""counts many (lo, hi) ranges, see count_range
+
+	@rtype: list
+	@returns: the counts, in ranges' order
+	"""
+	def count_range_many(self, ranges):
+		return [self.count_range(lo, hi) for lo, hi in ranges]
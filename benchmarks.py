@@ -0,0 +1,386 @@
+"""Benchmarks for AVLTree
+
+run: python benchmarks.py [benchmark ...] [--sizes 1000,100000] [--dists random,zipf]
+		[--json out.json] [--baseline old.json] [--tolerance 0.1] [--repeat 5]
+
+--json saves the results, --baseline compares them with results saved before and exits
+with status 1 if some operation got slower by more than the tolerance.
+"""
+
+import argparse
+from bisect import bisect
+import gc
+import heapq
+from itertools import accumulate
+import json
+import random
+import sys
+import time
+import tracemalloc
+
+from AVLTree import AVLTree
+from ChunkedAVLTree import ChunkedAVLTree
+
+
+"""returns n distinct keys in increasing order, each shuffled at most window places away"""
+def near_sorted(n, window=8, seed=0):
+	rnd = random.Random(seed)
+	keys = list(range(n))
+	for i in range(0, n, window):
+		block = keys[i:i + window]
+		rnd.shuffle(block)
+		keys[i:i + window] = block
+	return keys
+
+
+"""runs fn(*args) with the garbage collector off, as timeit does, and returns (seconds, result)"""
+def timed(fn, *args):
+	enabled = gc.isenabled()
+	gc.disable()
+	try:
+		start = time.perf_counter()
+		res = fn(*args)
+		return time.perf_counter() - start, res
+	finally:
+		if enabled:
+			gc.enable()
+
+
+"""insert vs finger_insert on an append-mostly key stream"""
+def bench_finger(n=200000):
+	rows = []
+	for name, keys in (('sorted', list(range(n))), ('near-sorted', near_sorted(n)),
+						('random', random.Random(0).sample(range(n), n))):
+		for method in ('insert', 'finger_insert'):
+			tree = AVLTree()
+			op = getattr(tree, method)
+			sec, res = timed(lambda: [op(key, None) for key in keys])
+			rows.append((name, method, n / sec))
+	print("%-12s %-14s %12s" % ("keys", "method", "ops/sec"))
+	for name, method, ops in rows:
+		print("%-12s %-14s %12.0f" % (name, method, ops))
+	return rows
+
+
+"""returns m indices in range(n) drawn from a zipfian distribution with exponent s,
+index i with probability proportional to 1 / (i+1)**s"""
+def zipf_indices(n, m, s=1.1, seed=0):
+	rnd = random.Random(seed)
+	cum = list(accumulate(1.0 / (i + 1) ** s for i in range(n)))
+	return [min(bisect(cum, rnd.random() * cum[-1]), n - 1) for _ in range(m)]
+
+
+"""returns the keys 0..n-1 in the order they are inserted, and m keys to query in that order.
+sorted & reverse query the keys in insertion order, random queries uniformly random keys,
+zipf inserts in random order and queries a few hot keys most of the time"""
+def key_streams(dist, n, m, seed=0):
+	rnd = random.Random(seed)
+	if dist == 'sorted':
+		keys = list(range(n))
+		return keys, [keys[i * n // m] for i in range(m)]
+	if dist == 'reverse':
+		keys = list(range(n - 1, -1, -1))
+		return keys, [keys[i * n // m] for i in range(m)]
+	keys = rnd.sample(range(n), n)
+	if dist == 'random':
+		return keys, [rnd.randrange(n) for _ in range(m)]
+	if dist == 'zipf':
+		return keys, [keys[i] for i in zipf_indices(n, m, seed=seed)]
+	raise ValueError("unknown key distribution %r" % (dist,))
+
+
+"""sums the rebalance counts returned by the operations, (rank, count) pairs count their count"""
+def total(counts):
+	return sum(c[1] if isinstance(c, tuple) else c for c in counts)
+
+
+"""every AVLTree operation on n keys of one distribution.
+the keys are inserted with insert (and, into another tree, FT_insert), then queried m times
+with search, rank & select, then split and joined back m times, listed with avl_to_array,
+and finally the distinct queried keys are deleted
+
+@rtype: list
+@returns: a row per operation - dicts with the ops/sec, tree height, peak memory & rebalance counts
+"""
+def bench_ops_dist(dist, n, m=None):
+	m = m or min(n, 100000)
+	keys, queries = key_streams(dist, n, m)
+	rows = []
+
+	def row(op, sec, ops, counts=None, **extra):
+		rows.append(dict(dist=dist, n=n, op=op, ops=ops, seconds=sec, ops_per_sec=ops / sec if sec else None,
+						rebalances=None if counts is None else total(counts), **extra))
+
+	tracemalloc.start()
+	tree = AVLTree()
+	for key in keys:
+		tree.insert(key, key)
+	peak = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	del tree
+
+	tree = AVLTree()
+	sec, counts = timed(lambda: [tree.insert(key, key) for key in keys])
+	row('insert', sec, n, counts, height=tree.tree_height(), peak_bytes=peak, bytes_per_key=peak / n)
+	ft = AVLTree()
+	sec, counts = timed(lambda: [ft.FT_insert(key, key) for key in keys])
+	row('FT_insert', sec, n, counts, height=ft.tree_height())
+	del ft
+
+	sec, nodes = timed(lambda: [tree.search(key) for key in queries])
+	row('search', sec, m)
+	sec, ranks = timed(lambda: [tree.rank(x) for x in nodes])
+	row('rank', sec, m)
+	sec, found = timed(lambda: [tree.select(r) for r in ranks])
+	row('select', sec, m)
+
+	splits = joins = 0.0
+	h_diffs = []
+	for x in nodes[:min(m, 1000)]:  # split at x, then put x back with join
+		key, val = x.get_key(), x.get_value()
+		sec, (left, right) = timed(tree.split, tree.search(key))
+		splits += sec
+		sec, h_diff = timed(left.join, right, key, val)
+		joins += sec
+		h_diffs.append(h_diff)
+		tree = left
+	row('split', splits, len(h_diffs))
+	row('join', joins, len(h_diffs), h_diffs)
+
+	sec, lst = timed(tree.avl_to_array)
+	row('avl_to_array', sec, n)
+
+	doomed = list(dict.fromkeys(queries))
+	sec, counts = timed(lambda: [tree.delete(tree.search(key)) for key in doomed])
+	row('delete', sec, len(doomed), counts, height=tree.tree_height())
+	return rows
+
+
+"""keeps the median run of every operation of repeated bench_ops_dist runs. runs are alike
+but for their timings. the median, unlike the fastest run, is not thrown by a lucky run
+
+@type runs: list
+@param runs: the rows of each run
+@rtype: list
+"""
+def median_rows(runs):
+	rows = []
+	for op_rows in zip(*runs):
+		r = dict(sorted(op_rows, key=lambda r: r['seconds'])[len(op_rows) // 2])
+		r['repeat'] = len(op_rows)
+		rows.append(r)
+	return rows
+
+
+"""every AVLTree operation, for every size and key distribution, each the median of repeat runs.
+the runs go round all sizes & distributions repeat times, so a slow spell of the machine hits
+one run of each rather than all runs of one"""
+def bench_ops(sizes=(1000, 10000, 100000), dists=('sorted', 'reverse', 'random', 'zipf'), repeat=5):
+	runs = {(n, dist): [] for n in sizes for dist in dists}
+	for i in range(repeat):
+		for n, dist in runs:
+			runs[n, dist].append(bench_ops_dist(dist, n))
+	rows = []
+	for n, dist in runs:
+		rows.extend(median_rows(runs[n, dist]))
+	print("%-8s %9s %-13s %12s %7s %11s" % ("keys", "n", "op", "ops/sec", "height", "rebalances"))
+	for r in rows:
+		print("%-8s %9d %-13s %12.0f %7s %11s" % (r['dist'], r['n'], r['op'], r['ops_per_sec'] or 0,
+												r.get('height', ''), '' if r['rebalances'] is None else r['rebalances']))
+	return rows
+
+
+"""compares ops results with a baseline, prints the ratio of every operation found in both.
+both sides should be medians of several runs (see bench_ops), single timings are too noisy
+
+@rtype: list
+@returns: the rows slower than the baseline by more than tolerance
+"""
+def compare(rows, baseline, tolerance=0.1):
+	base = {(r['dist'], r['n'], r['op']): r for r in baseline}
+	slower = []
+	print("%-8s %9s %-13s %12s %12s %7s" % ("keys", "n", "op", "ops/sec", "baseline", "ratio"))
+	for r in rows:
+		b = base.get((r['dist'], r['n'], r['op']))
+		if b is None or not r['ops_per_sec'] or not b['ops_per_sec']:
+			continue
+		ratio = r['ops_per_sec'] / b['ops_per_sec']
+		flag = ''
+		if ratio < 1 - tolerance:
+			slower.append(r)
+			flag = '  slower'
+		print("%-8s %9d %-13s %12.0f %12.0f %7.2f%s" % (r['dist'], r['n'], r['op'], r['ops_per_sec'],
+														b['ops_per_sec'], ratio, flag))
+	return slower
+
+
+"""AVLTree as a scheduler queue vs heapq: n jobs with random deadlines are queued, then each
+round pops the due job, queues a new one a little later, and every batch rounds pops the next
+batch due jobs at once (pop_min_n, k heappops). keys are (deadline, sequence number) pairs"""
+def bench_queue(n=100000, rounds=100000, batch=64):
+	rnd = random.Random(0)
+	jobs = [(rnd.random() * n, i) for i in range(n)]
+	later = [rnd.random() * 100 for _ in range(rounds)]
+
+	def run_tree():
+		tree = AVLTree.from_sorted(sorted((job, None) for job in jobs))
+		seq = n
+		for r in range(rounds):
+			(deadline, i), val = tree.pop_min()
+			tree.insert((deadline + later[r], seq), None)
+			seq += 1
+			if r % batch == 0:
+				for job, val in tree.pop_min_n(batch):
+					tree.insert((job[0] + later[r], seq), None)
+					seq += 1
+		return tree.peek_min()
+
+	def run_heap():
+		heap = list(jobs)
+		heapq.heapify(heap)
+		seq = n
+		for r in range(rounds):
+			deadline, i = heapq.heappop(heap)
+			heapq.heappush(heap, (deadline + later[r], seq))
+			seq += 1
+			if r % batch == 0:
+				for job in [heapq.heappop(heap) for _ in range(batch)]:
+					heapq.heappush(heap, (job[0] + later[r], seq))
+					seq += 1
+		return heap[0]
+
+	rows = []
+	for name, run in (('AVLTree', run_tree), ('heapq', run_heap)):
+		sec, first = timed(run)
+		rows.append((name, rounds / sec))
+	print("%-10s %12s" % ("queue", "rounds/sec"))
+	for name, ops in rows:
+		print("%-10s %12.0f" % (name, ops))
+	return rows
+
+
+"""collects the GC's pauses while it is open, see gc.callbacks"""
+class GCPauses(object):
+
+	def __init__(self):
+		self.pauses = []
+		self.start = None
+
+	def __call__(self, phase, info):
+		if phase == 'start':
+			self.start = time.perf_counter()
+		elif self.start is not None:
+			self.pauses.append(time.perf_counter() - self.start)
+
+	def __enter__(self):
+		gc.callbacks.append(self)
+		return self
+
+	def __exit__(self, *exc):
+		gc.callbacks.remove(self)
+
+
+"""steady-state churn with and without a NodePool: a tree of n keys gets ops operations,
+as many inserts as deletes (pop_min & insert of a larger key, and random delete_key & insert).
+reports ops/sec, new nodes allocated per op, GC collections and the GC pauses"""
+def bench_churn(n=100000, ops=200000, cap=1024):
+	rows = []
+	for pooled in (False, True):
+		rnd = random.Random(0)
+		tree = AVLTree.from_sorted([(key, None) for key in range(0, 2 * n, 2)])
+		pool = tree.enable_pool(cap) if pooled else None
+		allocs = [0]
+		make_node = tree.make_node
+		if not pooled:
+			def counted(key, val):
+				allocs[0] += 1
+				return make_node(key, val)
+			tree.make_node = counted
+		gc.collect()
+		with GCPauses() as pauses:
+			start = time.perf_counter()
+			top = 2 * n
+			for i in range(ops // 4):
+				tree.pop_min()
+				tree.insert(top, None)
+				top += 1
+				x = tree.select(rnd.randrange(tree.size()) + 1)
+				tree.delete_key(x.get_key())
+				tree.insert(top, None)
+				top += 1
+			sec = time.perf_counter() - start
+		if pooled:
+			allocs[0] = 2 * (ops // 4) - pool.reused  # the inserts not served by the pool
+		rows.append(('pool' if pooled else 'no pool', ops / sec, allocs[0] / ops, len(pauses.pauses),
+					sum(pauses.pauses), max(pauses.pauses, default=0.0)))
+	print("%-8s %10s %12s %6s %10s %10s" % ("", "ops/sec", "allocs/op", "GCs", "GC total", "GC max"))
+	for name, rate, allocs, gcs, total, longest in rows:
+		print("%-8s %10.0f %12.3f %6d %9.1fms %9.2fms" % (name, rate, allocs, gcs, total * 1000, longest * 1000))
+	return rows
+
+
+"""the plain AVLTree vs ChunkedAVLTree with several chunk sizes (int keys in typed arrays):
+n random inserts, n searches, n/2 deletes, and the memory held per key"""
+def bench_chunks(n=200000, chunks=(16, 64, 256)):
+	keys = random.Random(0).sample(range(4 * n), n)
+	queries = random.Random(1).sample(keys, n)
+	setups = [('AVLTree', AVLTree)] + [('chunk=%d' % c, (lambda c=c: ChunkedAVLTree(c, 'q'))) for c in chunks]
+	rows = []
+	for name, make in setups:
+		tracemalloc.start()
+		tree = make()
+		for key in keys:
+			tree.insert(key, None)
+		mem = tracemalloc.get_traced_memory()[0]
+		tracemalloc.stop()
+		tree = make()
+		ins, res = timed(lambda: [tree.insert(key, None) for key in keys])
+		srch, res = timed(lambda: [tree.search(key) for key in queries])
+		dele, res = timed(lambda: [tree.delete_key(key) for key in queries[:n // 2]])
+		rows.append((name, n / ins, n / srch, (n // 2) / dele, mem / n))
+	print("%-10s %12s %12s %12s %10s" % ("tree", "insert/sec", "search/sec", "delete/sec", "bytes/key"))
+	for row in rows:
+		print("%-10s %12.0f %12.0f %12.0f %10.1f" % row)
+	return rows
+
+
+BENCHMARKS = {
+	'finger': bench_finger,
+	'ops': bench_ops,
+	'queue': bench_queue,
+	'churn': bench_churn,
+	'chunks': bench_chunks,
+}
+
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description="AVLTree benchmarks")
+	parser.add_argument('benchmarks', nargs='*', help="some of: %s, all if none given" % ", ".join(sorted(BENCHMARKS)))
+	parser.add_argument('--sizes', default='1000,10000,100000', help="ops: comma separated tree sizes")
+	parser.add_argument('--dists', default='sorted,reverse,random,zipf', help="ops: comma separated key distributions")
+	parser.add_argument('--json', help="write the results to this file")
+	parser.add_argument('--baseline', help="compare the ops results with this file, written by --json")
+	parser.add_argument('--tolerance', type=float, default=0.1, help="the slowdown that counts as a regression")
+	parser.add_argument('--repeat', type=int, default=5, help="ops: runs per operation, the median is kept")
+	args = parser.parse_args()
+	for name in args.benchmarks:
+		if name not in BENCHMARKS:
+			parser.error("unknown benchmark %r" % (name,))
+
+	results = {}
+	for name in args.benchmarks or sorted(BENCHMARKS):
+		print("== %s ==" % name)
+		if name == 'ops':
+			results[name] = bench_ops([int(float(n)) for n in args.sizes.split(',')], args.dists.split(','),
+									args.repeat)
+		else:
+			results[name] = BENCHMARKS[name]()
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(results, f, indent=1)
+	if args.baseline and 'ops' in results:
+		with open(args.baseline) as f:
+			baseline = json.load(f).get('ops', [])
+		print("== baseline %s ==" % args.baseline)
+		if compare(results['ops'], baseline, args.tolerance):
+			sys.exit(1)
@@ -0,0 +1,44 @@
+"""checks & builders shared by the tests"""
+
+from AVLTree import AVLTree
+
+
+"""returns an AVLTree of items, (key, value) pairs in any order"""
+def tree_of(items, aggregates=None):
+	tree = AVLTree(None, aggregates)
+	tree.insert_many(items)
+	return tree
+
+
+"""asserts the invariants of an AVLTree: keys in order, balance, heights, sizes, parent links,
+aggregates (if kept) and the cached minimum & maximum"""
+def check_shape(tree):
+	monoids = tree.monoids
+
+	def walk(x, par, lo, hi):
+		if not x.is_real_node():
+			return -1, 0, None if monoids is None else tuple(m.identity for m in monoids)
+		assert x.get_parent() is par
+		assert (lo is None or lo < x.get_key()) and (hi is None or x.get_key() < hi)
+		lh, ls, la = walk(x.get_left(), x, lo, x.get_key())
+		rh, rs, ra = walk(x.get_right(), x, x.get_key(), hi)
+		assert abs(lh - rh) <= 1 and x.get_height() == max(lh, rh) + 1 and x.get_size() == ls + rs + 1
+		agg = None
+		if monoids is not None:
+			agg = tuple(m.combine(m.combine(la[i], m.lift(x.get_value())), ra[i]) for i, m in enumerate(monoids))
+			assert x.agg == agg
+		return x.get_height(), x.get_size(), agg
+
+	root = tree.get_root()
+	if root is None:
+		assert tree.get_min() is None and tree.get_max() is None
+		return
+	walk(root, None, None, None)
+	x = root
+	while x.get_left().is_real_node():
+		x = x.get_left()
+	assert tree.get_min() is x
+	x = root
+	while x.get_right().is_real_node():
+		x = x.get_right()
+	assert tree.get_max() is x
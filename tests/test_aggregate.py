@@ -0,0 +1,82 @@
+import operator
+import random
+
+from AVLTree import AugmentedAVLNode, Monoid, MIN, MAX, SUM, count_if
+from helpers import check_shape, tree_of
+
+
+"""values in order of keys - a monoid that is not commutative, so it catches a misordered combine"""
+SEQ = Monoid(operator.add, (), lambda value: (value,))
+
+
+def aggregates():
+	return {'min': MIN, 'max': MAX, 'sum': SUM, 'odd': count_if(lambda value: value % 2 == 1), 'seq': SEQ}
+
+
+def brute(items, lo, hi, inclusive):
+	vals = [val for key, val in sorted(items.items())
+			if (lo is None or key > lo or (inclusive[0] and key == lo)) and
+			(hi is None or key < hi or (inclusive[1] and key == hi))]
+	return {'min': min(vals, default=float('inf')), 'max': max(vals, default=float('-inf')),
+			'sum': sum(vals), 'odd': sum(1 for val in vals if val % 2 == 1), 'seq': tuple(vals)}
+
+
+def test_aggregate_matches_brute_force():
+	rnd = random.Random(9)
+	for trial in range(100):
+		items = {key: rnd.randint(-50, 50) for key in rnd.sample(range(300), rnd.randint(0, 120))}
+		tree = tree_of(items.items(), aggregates())
+		check_shape(tree)
+		for query in range(20):
+			lo = rnd.choice([None, rnd.randint(-10, 310)])
+			hi = rnd.choice([None, rnd.randint(-10, 310)])
+			inclusive = (rnd.random() < 0.5, rnd.random() < 0.5)
+			assert tree.aggregate(lo, hi, None, inclusive) == brute(items, lo, hi, inclusive)
+			assert tree.aggregate(lo, hi, 'seq', inclusive) == brute(items, lo, hi, inclusive)['seq']
+
+
+def test_empty_range_gives_identity():
+	tree = tree_of(((key, key) for key in range(10)), aggregates())
+	assert tree.aggregate(5, 4) == brute({}, None, None, (True, True))
+	assert tree.aggregate(5, 5, 'seq', (False, True)) == ()
+	assert tree_of([], aggregates()).aggregate(None, None, 'min') == float('inf')
+
+
+def no_walk(self, val):
+	raise AssertionError("set_value called from a batch path")
+
+
+def test_batch_merges_keep_aggregates(monkeypatch):
+	monkeypatch.setattr(AugmentedAVLNode, 'set_value', no_walk)
+	rnd = random.Random(10)
+	add = lambda val, other_val: val + other_val
+	for trial in range(100):
+		a = {key: rnd.randint(-50, 50) for key in rnd.sample(range(400), rnd.randint(0, 200))}
+		b = {key: rnd.randint(-50, 50) for key in rnd.sample(range(400), rnd.randint(0, 200))}
+		for op in ('insert_many', 'union', 'intersection', 'difference'):
+			tree, other = tree_of(a.items(), aggregates()), tree_of(b.items(), aggregates())
+			if op == 'insert_many':
+				tree.insert_many(b.items())
+				expect = dict(a)
+				expect.update(b)
+			elif op == 'union':
+				tree.union(other, add)
+				expect = dict(b)
+				expect.update((key, val + b[key] if key in b else val) for key, val in a.items())
+			elif op == 'intersection':
+				tree.intersection(other, add)
+				expect = {key: val + b[key] for key, val in a.items() if key in b}
+			else:
+				tree.difference(other)
+				expect = {key: val for key, val in a.items() if key not in b}
+			assert tree.avl_to_array() == sorted(expect.items()), op
+			check_shape(tree)
+			assert tree.aggregate() == brute(expect, None, None, (True, True)), op
+
+
+def test_upsert_keeps_aggregates():
+	tree = tree_of(((key, key) for key in range(50)), aggregates())
+	tree.upsert(20, 1000)
+	tree.upsert(70, -5)
+	check_shape(tree)
+	assert tree.aggregate(None, None, 'max') == 1000 and tree.aggregate(None, None, 'min') == -5
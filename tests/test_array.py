@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from ArrayAVLTree import ArrayAVLTree
+from AVLTree import AVLTree
+
+
+def shape(x):
+	if x is None or not x.is_real_node():
+		return None
+	return (x.get_key(), x.get_value(), x.get_height(), x.get_size(), shape(x.get_left()), shape(x.get_right()))
+
+
+def same(a, b):
+	assert shape(a.get_root()) == shape(b.get_root())
+	assert a.avl_to_array() == b.avl_to_array()
+	assert a.size() == b.size()
+	if a.get_root() is not None:
+		assert a.get_min().get_key() == b.get_min().get_key()
+
+
+def test_insert_delete_rank_select_match_avl_tree():
+	for seed in range(6):
+		rnd = random.Random(seed)
+		a, b = AVLTree(), ArrayAVLTree()
+		keys = set()
+		for i in range(3000):
+			key = rnd.randrange(4000)
+			if key in keys:
+				assert a.delete(a.search(key)) == b.delete(b.search(key))
+				keys.discard(key)
+			else:
+				assert a.insert(key, -key) == b.insert(key, -key)
+				keys.add(key)
+		same(a, b)
+		keys = sorted(keys)
+		for i in range(1, len(keys) + 1, 13):
+			assert b.select(i).get_key() == a.select(i).get_key() == keys[i - 1]
+			assert b.rank(b.search(keys[i - 1])) == a.rank(a.search(keys[i - 1])) == i
+		assert b.search(-1) is None
+
+
+def test_split_join_match_avl_tree():
+	for seed in range(6):
+		rnd = random.Random(seed)
+		a, b = AVLTree(), ArrayAVLTree()
+		for key in rnd.sample(range(4000), 1500):
+			a.insert(key, key)
+			b.insert(key, key)
+		pivot = a.select(rnd.randint(1, 1500)).get_key()
+		la, ra = a.split(a.search(pivot))
+		lb, rb = b.split(b.search(pivot))
+		same(la, lb)
+		same(ra, rb)
+		assert la.join(ra, pivot, 0) == lb.join(rb, pivot, 0)
+		same(la, lb)
+		c, d = ArrayAVLTree(), AVLTree()  # a join across node stores
+		for key in range(5000, 5100):
+			c.insert(key, key)
+			d.insert(key, key)
+		assert lb.join(c, 4500, 0) == la.join(d, 4500, 0)
+		same(la, lb)
+
+
+def test_copy_is_independent():
+	tree = ArrayAVLTree()
+	for key in range(100):
+		tree.insert(key, key)
+	snap = tree.copy()
+	tree.insert(-1, 0)
+	tree.delete(tree.search(50))
+	assert snap.size() == 100 and snap.search(50) is not None and snap.search(-1) is None
+	assert tree.size() == 100
+
+
+def test_duplicate_insert_raises_like_avl_tree():
+	for tree in (AVLTree(), ArrayAVLTree()):
+		for key in range(10):
+			tree.insert(key, key)
+		with pytest.raises(KeyError):
+			tree.insert(3, 'dup')
+		assert tree.size() == 10 and tree.avl_to_array() == [(key, key) for key in range(10)]
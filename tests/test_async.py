@@ -0,0 +1,71 @@
+import asyncio
+from unittest import mock
+
+from AsyncAVLTree import AsyncAVLTree
+from helpers import tree_of
+
+
+def test_merge_yields_when_keys_match():
+	tree = AsyncAVLTree(step=100)
+	a = [(key, key) for key in range(10000)]
+	b = a[1:]  # once i + j is odd, matching keys keep it odd
+	sleeps = []
+	real_sleep = asyncio.sleep
+
+	async def sleep(delay):
+		sleeps.append(delay)
+		await real_sleep(delay)
+
+	with mock.patch('AsyncAVLTree.asyncio.sleep', sleep):
+		asyncio.run(tree.merge_items(a, b, 'union', lambda val, other: other))
+	assert len(sleeps) >= 10000 // 100 - 1
+
+
+def test_small_batches_apply_in_place():
+	async def run():
+		tree = AsyncAVLTree(tree_of((key, key) for key in range(1000)), step=64)
+		node = tree.search(500)
+		await tree.insert_many([(500, 'x'), (2000, 'y')])
+		await tree.delete_many([1, 2, 3])
+		return tree, node
+	tree, node = asyncio.run(run())
+	assert tree.search(500) is node and node.get_value() == 'x'
+	expect = dict((key, key) for key in range(1000) if key not in (1, 2, 3))
+	expect.update({500: 'x', 2000: 'y'})
+	assert tree.tree.avl_to_array() == sorted(expect.items())
+
+
+def test_large_batches_rebuild():
+	async def run():
+		tree = AsyncAVLTree(tree_of((key, key) for key in range(0, 1000, 2)), step=16)
+		await tree.insert_many((key, -key) for key in range(500))
+		await tree.delete_many(range(900, 1000))
+		return tree
+	tree = asyncio.run(run())
+	expect = dict((key, key) for key in range(0, 900, 2))
+	expect.update((key, -key) for key in range(500))
+	assert tree.tree.avl_to_array() == sorted(expect.items())
+
+
+def test_partition_keeps_reads_whole():
+	async def run():
+		tree = AsyncAVLTree(tree_of((key, key) for key in range(1000)), step=16)
+		seen = []
+		done = False
+
+		async def reader():
+			while not done:
+				seen.append((tree.size(), tree.search(500) is not None))
+				await asyncio.sleep(0)
+
+		task = asyncio.create_task(reader())
+		await asyncio.sleep(0)
+		pieces = await tree.partition([100, 500, 900])
+		done = True
+		await task
+		return tree, pieces, seen
+	tree, pieces, seen = asyncio.run(run())
+	assert seen and all(size == 1000 and found for size, found in seen)
+	assert [piece.tree.avl_to_array() for piece in pieces] == \
+		[[(key, key) for key in range(lo, hi)] for lo, hi in ((0, 100), (100, 500), (500, 900), (900, 1000))]
+	assert tree.size() == 0
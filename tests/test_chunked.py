@@ -0,0 +1,40 @@
+import random
+
+from ChunkedAVLTree import ChunkedAVLTree
+
+
+def test_from_sorted_empty():
+	tree = ChunkedAVLTree.from_sorted([])
+	assert tree.size() == 0 and tree.avl_to_array() == []
+	tree.insert(1, 'a')
+	assert tree.get(1) == 'a'
+
+
+def test_matches_dict():
+	rnd = random.Random(3)
+	tree = ChunkedAVLTree.from_sorted([(key, key) for key in range(0, 2000, 2)], chunk=16, typecode='q')
+	ref = dict((key, key) for key in range(0, 2000, 2))
+	for i in range(3000):
+		key = rnd.randrange(2000)
+		if key in ref:
+			assert tree.pop(key) == ref.pop(key)
+		else:
+			tree.insert(key, -key)
+			ref[key] = -key
+	assert tree.avl_to_array() == sorted(ref.items())
+	keys = sorted(ref)
+	for i in range(1, len(keys) + 1, 13):
+		assert tree.select(i) == (keys[i - 1], ref[keys[i - 1]]) and tree.rank(keys[i - 1]) == i
+	left, right = tree.split(1000)
+	assert left.avl_to_array() + right.avl_to_array() == [item for item in sorted(ref.items()) if item[0] != 1000]
+
+
+def test_chunks_counts_nodes():
+	assert ChunkedAVLTree().chunks() == 0
+	tree = ChunkedAVLTree.from_sorted([(key, key) for key in range(1000)], chunk=64)
+	assert tree.chunks() == 16
+	for key in range(1000, 1100):
+		tree.insert(key, key)
+	def count(x):
+		return 0 if not x.is_real_node() else 1 + count(x.get_left()) + count(x.get_right())
+	assert tree.chunks() == count(tree.index.get_root()) > 16
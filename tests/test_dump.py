@@ -0,0 +1,68 @@
+import pytest
+
+from AVLTree import AVLTree, DUMP_HEADER, DUMP_MAGIC, DUMP_VERSION, MAX, MIN, SUM
+from helpers import check_shape, tree_of
+
+
+def shape(x):
+	if not x.is_real_node():
+		return None
+	return (x.get_key(), x.get_value(), x.get_height(), x.get_size(), shape(x.get_left()), shape(x.get_right()))
+
+
+def test_round_trip_keeps_shape_ends_and_aggregates(tmp_path):
+	aggregates = {'s': SUM, 'lo': MIN, 'hi': MAX}
+	tree = AVLTree(None, aggregates)
+	for key in [5, -3, 9, 1 << 40, -(1 << 62), 7, 0, 2, 8]:
+		tree.insert(key, key % 97)
+	path = str(tmp_path / 'tree.avl')
+	tree.dump(path)
+	copy = AVLTree.load(path, aggregates)
+	check_shape(copy)
+	assert shape(copy.get_root()) == shape(tree.get_root())
+	assert copy.get_min().get_key() == -(1 << 62) and copy.get_max().get_key() == 1 << 40
+	assert copy.get_root().agg == tree.get_root().agg
+	assert copy.aggregate(0, 8) == tree.aggregate(0, 8)
+
+
+def test_round_trip_of_any_values(tmp_path):
+	tree = tree_of((key, {'k': [key] * 3}) for key in range(500))
+	path = str(tmp_path / 'tree.avl')
+	tree.dump(path)
+	assert AVLTree.load(path).avl_to_array() == tree.avl_to_array()
+
+
+def test_empty_tree(tmp_path):
+	path = str(tmp_path / 'empty.avl')
+	AVLTree().dump(path)
+	tree = AVLTree.load(path)
+	assert tree.get_root() is None and tree.size() == 0 and tree.get_min() is None
+
+
+def write_header(path, magic, version):
+	AVLTree().dump(path)
+	with open(path, 'r+b') as f:
+		f.write(DUMP_HEADER.pack(magic, version, 0, 0, DUMP_HEADER.size))
+
+
+def test_bad_magic(tmp_path):
+	path = str(tmp_path / 'bad.avl')
+	write_header(path, b'NOPE', DUMP_VERSION)
+	with pytest.raises(ValueError, match="not an AVLTree dump"):
+		AVLTree.load(path)
+
+
+def test_newer_version(tmp_path):
+	path = str(tmp_path / 'new.avl')
+	write_header(path, DUMP_MAGIC, DUMP_VERSION + 1)
+	with pytest.raises(ValueError, match="newer"):
+		AVLTree.load(path)
+
+
+@pytest.mark.parametrize('key', ['a', 1.5, 1 << 63, (1, 2)])
+def test_rejects_keys_other_than_64_bit_ints(tmp_path, key):
+	tree = tree_of([(key, 0)])
+	path = tmp_path / 'bad.avl'
+	with pytest.raises(ValueError, match="64 bit ints"):
+		tree.dump(str(path))
+	assert not path.exists()
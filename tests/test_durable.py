@@ -0,0 +1,53 @@
+import pytest
+
+from DurableAVLTree import DurableAVLTree
+
+
+def test_rejected_insert_is_not_replayed(tmp_path):
+	with DurableAVLTree(str(tmp_path), group_size=1) as tree:
+		tree.insert(10, 10)
+		with pytest.raises(KeyError):
+			tree.insert(10, 'dup')
+		assert tree.search(10).get_value() == 10
+	with DurableAVLTree(str(tmp_path)) as tree:
+		assert tree.avl_to_array() == [(10, 10)]
+
+
+def test_reopen_replays_log_and_snapshot(tmp_path):
+	ref = {}
+	with DurableAVLTree(str(tmp_path), group_size=16) as tree:
+		for key in range(100):
+			tree.insert(key, str(key))
+			ref[key] = str(key)
+		for key in range(0, 100, 3):
+			tree.delete(tree.search(key))
+			del ref[key]
+		tree.checkpoint()
+		tree.insert_many((key, -key) for key in range(90, 110))
+		ref.update((key, -key) for key in range(90, 110))
+		tree.delete_many(range(50, 60))
+		for key in range(50, 60):
+			ref.pop(key, None)
+	with DurableAVLTree(str(tmp_path)) as tree:
+		assert tree.avl_to_array() == sorted(ref.items())
+
+
+def test_rejected_batch_is_not_replayed(tmp_path):
+	with DurableAVLTree(str(tmp_path), group_size=1) as tree:
+		tree.insert(1, 'a')
+		with pytest.raises(TypeError):
+			tree.insert_many([(2, 'b'), ('x', 'c')])
+		with pytest.raises(TypeError):
+			tree.delete_many([1, 'x'])
+		assert tree.avl_to_array() == [(1, 'a')]
+	with DurableAVLTree(str(tmp_path)) as tree:
+		assert tree.avl_to_array() == [(1, 'a')]
+
+
+def test_checkpoint_needs_int_keys(tmp_path):
+	with DurableAVLTree(str(tmp_path), group_size=1) as tree:
+		tree.insert('a', 1)
+		with pytest.raises(ValueError):
+			tree.checkpoint()
+	with DurableAVLTree(str(tmp_path)) as tree:
+		assert tree.avl_to_array() == [('a', 1)]
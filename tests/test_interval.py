@@ -0,0 +1,71 @@
+import random
+
+from AVLTree import SUM
+from helpers import check_shape
+from IntervalTree import IntervalTree
+
+
+def brute(intervals, lo, hi):
+	return sorted((key, end) for key, end in intervals.items() if key[0] <= hi and end >= lo)
+
+
+def check_queries(tree, intervals, rnd):
+	check_shape(tree)
+	assert tree.max_end() == max(intervals.values(), default=float('-inf'))
+	for i in range(30):
+		lo = rnd.randint(-50, 1100)
+		hi = lo + rnd.randint(0, 60)
+		assert list(tree.overlap(lo, hi)) == brute(intervals, lo, hi)
+		point = rnd.randint(-10, 1100)
+		assert list(tree.stab(point)) == brute(intervals, point, point)
+
+
+def random_intervals(rnd, n, first=0):
+	intervals = {}
+	for i in range(first, first + n):
+		start = rnd.randint(0, 1000)
+		intervals[(start, i)] = start + rnd.randint(0, 80)
+	return intervals
+
+
+def tree_of(intervals):
+	tree = IntervalTree(start=lambda key: key[0])
+	for key, end in intervals.items():
+		tree.insert(key, end)
+	return tree
+
+
+def test_overlap_matches_brute_force_after_deletes():
+	rnd = random.Random(3)
+	for trial in range(20):
+		intervals = random_intervals(rnd, rnd.randint(0, 300))
+		tree = tree_of(intervals)
+		check_queries(tree, intervals, rnd)
+		for key in rnd.sample(sorted(intervals), len(intervals) // 2):
+			tree.delete_key(key)
+			del intervals[key]
+		check_queries(tree, intervals, rnd)
+
+
+def test_overlap_after_split_and_join():
+	rnd = random.Random(4)
+	for trial in range(20):
+		intervals = random_intervals(rnd, rnd.randint(1, 300))
+		tree = tree_of(intervals)
+		key = rnd.choice(sorted(intervals))
+		left, x, right = tree.split_key(key)
+		assert isinstance(left, IntervalTree) and isinstance(right, IntervalTree)
+		check_queries(left, {k: e for k, e in intervals.items() if k < key}, rnd)
+		check_queries(right, {k: e for k, e in intervals.items() if k > key}, rnd)
+		left.join(right, key, intervals[key])
+		check_queries(left, intervals, rnd)
+
+
+def test_plain_keys_and_more_aggregates():
+	tree = IntervalTree(aggregates={'s': SUM})
+	for start in range(0, 100, 10):
+		tree.insert(start, start + 15)
+	assert list(tree.stab(25)) == [(10, 25), (20, 35)]
+	assert list(tree.overlap(200, 300)) == []
+	assert tree.aggregate(name='s') == sum(start + 15 for start in range(0, 100, 10))
+	assert list(IntervalTree().stab(0)) == [] and IntervalTree().max_end() == float("-inf")
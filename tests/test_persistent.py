@@ -0,0 +1,77 @@
+import random
+
+from PersistentAVLTree import PersistentAVLTree, height, size
+
+
+def check_shape(x, lo=None, hi=None):
+	if x is None:
+		return
+	assert (lo is None or lo < x.key) and (hi is None or x.key < hi)
+	assert abs(height(x.left) - height(x.right)) <= 1
+	assert x.height == 1 + max(height(x.left), height(x.right)) and x.size == 1 + size(x.left) + size(x.right)
+	check_shape(x.left, lo, x.key)
+	check_shape(x.right, x.key, hi)
+
+
+def node_ids(x):
+	return set() if x is None else {id(x)} | node_ids(x.left) | node_ids(x.right)
+
+
+def fields(x):
+	return None if x is None else (x.key, x.value, x.height, x.size, fields(x.left), fields(x.right))
+
+
+def test_snapshots_never_change():
+	for seed in range(4):
+		rnd = random.Random(seed)
+		tree = PersistentAVLTree()
+		ref = {}
+		versions = []
+		for i in range(2000):
+			key = rnd.randrange(1500)
+			if key in ref and rnd.random() < .5:
+				tree.delete(tree.search(key))
+				del ref[key]
+			else:
+				tree.insert(key, i)
+				ref[key] = i
+			if i % 200 == 0:
+				snap = tree.snapshot()
+				versions.append((snap, sorted(ref.items()), fields(snap.root)))
+		check_shape(tree.root)
+		assert tree.avl_to_array() == sorted(ref.items())
+		for snap, items, shape in versions:
+			assert snap.avl_to_array() == items and fields(snap.root) == shape
+
+
+def test_versions_share_untouched_subtrees():
+	tree = PersistentAVLTree()
+	for key in range(1024):
+		tree.insert(key, key)
+	old = tree.snapshot()
+	tree.insert(5000, 0)
+	assert len(node_ids(tree.root) - node_ids(old.root)) <= 2 * tree.tree_height() + 2
+
+
+def test_rank_select_split_join():
+	rnd = random.Random(11)
+	tree = PersistentAVLTree()
+	keys = sorted(rnd.sample(range(5000), 1200))
+	for key in keys:
+		tree.insert(key, -key)
+	for i in range(1, len(keys) + 1, 7):
+		assert tree.select(i).key == keys[i - 1] and tree.rank(tree.search(keys[i - 1])) == i
+	before = fields(tree.root)
+	pivot = keys[400]
+	left, right = tree.split(tree.search(pivot))
+	check_shape(left.root)
+	check_shape(right.root)
+	assert [key for key, val in left.items()] == keys[:400]
+	assert [key for key, val in right.items()] == keys[401:]
+	assert fields(tree.root) == before  # split leaves self as it was
+	left.join(right, pivot, 'p')
+	check_shape(left.root)
+	assert left.root is right.root and left.size() == len(keys) and left.search(pivot).value == 'p'
+	left.join(PersistentAVLTree(), 10 ** 6, 0)
+	check_shape(left.root)
+	assert left.get_max().key == 10 ** 6 and left.get_min().key == keys[0]
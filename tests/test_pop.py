@@ -0,0 +1,35 @@
+import random
+
+from AVLTree import AVLTree, SUM
+from helpers import check_shape
+
+
+def test_pop_ends_match_sorted_list():
+	rnd = random.Random(9)
+	for aggregates in (None, {'s': SUM}):
+		tree = AVLTree(None, aggregates)
+		tree.enable_pool()
+		ref = []
+		for i in range(3000):
+			if ref and rnd.random() < 0.45:
+				if rnd.random() < 0.5:
+					assert tree.pop_min() == (ref[0], ref[0])
+					ref.pop(0)
+				else:
+					assert tree.pop_max() == (ref[-1], ref[-1])
+					ref.pop()
+			else:
+				key = rnd.randrange(10 ** 6)
+				if tree.search(key) is None:
+					tree.insert(key, key)
+					ref.append(key)
+					ref.sort()
+			if i % 100 == 0:
+				check_shape(tree)
+			assert tree.peek_min() == (None if not ref else (ref[0], ref[0]))
+			assert tree.peek_max() == (None if not ref else (ref[-1], ref[-1]))
+			assert tree.size() == len(ref)
+		while ref:
+			assert tree.pop_min() == (ref[0], ref[0])
+			ref.pop(0)
+		assert tree.get_root() is None and tree.get_min() is None and tree.get_max() is None
@@ -0,0 +1,76 @@
+import math
+import random
+from unittest import mock
+
+from AVLTree import AVLNode, AVLTree, SUM
+from helpers import check_shape
+
+
+def inside(key, lo, hi, inclusive):
+	return (lo is None or key > lo or (key == lo and inclusive[0])) and \
+		(hi is None or key < hi or (key == hi and inclusive[1]))
+
+
+def test_extract_range_matches_brute_force():
+	rnd = random.Random(5)
+	for trial in range(300):
+		tree = AVLTree(None, {'s': SUM} if trial % 2 else None)
+		if trial % 3 == 0:
+			tree.enable_fingers()
+		if trial % 5 == 0:
+			tree.enable_pool()
+		keys = sorted(rnd.sample(range(200), rnd.randint(0, 80)))
+		for key in keys:
+			tree.insert(key, 2 * key)
+		lo = rnd.choice([None, rnd.randint(-5, 205)] + keys[:1] + keys[-1:])
+		hi = rnd.choice([None, rnd.randint(-5, 205)] + keys[:1] + keys[-1:])
+		inclusive = (rnd.random() < .5, rnd.random() < .5)
+		cut = tree.extract_range(lo, hi, inclusive)
+		assert cut.avl_to_array() == [(key, 2 * key) for key in keys if inside(key, lo, hi, inclusive)]
+		assert tree.avl_to_array() == [(key, 2 * key) for key in keys if not inside(key, lo, hi, inclusive)]
+		check_shape(cut)
+		check_shape(tree)
+		for key in keys:
+			assert (tree.search(key) is None) == inside(key, lo, hi, inclusive)
+
+
+def test_delete_range_counts():
+	tree = AVLTree()
+	tree.insert_many((key, key) for key in range(100))
+	assert tree.delete_range(10, 19) == 10
+	assert tree.delete_range(10, 19) == 0
+	assert tree.delete_range(50, 40) == 0
+	assert tree.size() == 90
+
+
+def test_split_key_absent_keys():
+	tree = AVLTree()
+	tree.insert_many((key, key) for key in range(0, 100, 2))
+	left, x, right = tree.split_key(51)
+	assert x is None
+	assert [key for key, val in left.avl_to_array()] == list(range(0, 51, 2))
+	assert [key for key, val in right.avl_to_array()] == list(range(52, 100, 2))
+
+
+def test_extract_range_is_logarithmic():
+	updates = [0]
+	update_node = AVLNode.update_node
+
+	def counted(self, *args, **kwargs):
+		updates[0] += 1
+		return update_node(self, *args, **kwargs)
+
+	cost = {}
+	for n in (1 << 10, 1 << 16):
+		rnd = random.Random(1)
+		tree = AVLTree()
+		tree.insert_many((key, key) for key in range(n))
+		with mock.patch.object(AVLNode, 'update_node', counted):
+			for i in range(200):
+				lo = rnd.randrange(n)
+				updates[0] = 0
+				tree.extract_range(lo, lo + n // 1000)
+				cost.setdefault(n, []).append(updates[0])
+		cost[n] = sum(cost[n]) / len(cost[n])
+	# log2 n grows 1.6 times, (log2 n) ** 2 2.56 times
+	assert cost[1 << 16] / cost[1 << 10] < 2.2 and cost[1 << 16] < 30 * math.log2(1 << 16)
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+from helpers import tree_of
+
+numpy = pytest.importorskip('numpy')
+
+
+def test_list_batch():
+	tree = tree_of((key, -key) for key in range(0, 100, 3))
+	keys = [7, 3, 99, 3, -1, 0]
+	assert tree.search_many(keys) == [None, -3, -99, -3, None, 0]
+	assert tree.search_many(keys, default='x') == ['x', -3, -99, -3, 'x', 0]
+
+
+def test_numpy_batch_matches_search():
+	rnd = random.Random(17)
+	tree = tree_of((key, (key, 'v')) for key in rnd.sample(range(1000), 300))
+	keys = numpy.array([rnd.randrange(-10, 1010) for i in range(500)])
+	found, values = tree.search_many(keys)
+	assert found.dtype == bool and values.dtype == object and values.shape == (500,)
+	for j, key in enumerate(keys.tolist()):
+		node = tree.search(key)
+		assert found[j] == (node is not None)
+		assert values[j] == (node.get_value() if node is not None else None)
+
+
+def test_numpy_batch_numeric_dtype_with_missing_keys():
+	tree = tree_of((key, key * 10) for key in range(0, 50, 2))
+	keys = numpy.array([4, 5, 48, 100, 4])
+	found, values = tree.search_many(keys, dtype=int)
+	assert found.tolist() == [True, False, True, False, True]
+	assert values.dtype == numpy.dtype(int) and values.tolist() == [40, 0, 480, 0, 40]
+	found, values = tree.search_many(keys, default=-1, dtype=float)
+	assert values.tolist() == [40.0, -1.0, 480.0, -1.0, 40.0]
+	found, values = tree_of([]).search_many(keys, dtype=int)
+	assert not found.any() and values.tolist() == [0] * 5
@@ -0,0 +1,41 @@
+import random
+
+from helpers import tree_of
+
+
+def no_dump():
+	raise AssertionError("avl_to_array called")
+
+
+def test_set_operations_match_dicts():
+	rnd = random.Random(4)
+	for trial in range(200):
+		a = rnd.sample(range(400), rnd.randint(0, 200))
+		b = rnd.sample(range(400), rnd.randint(0, 200))
+		for op in ('union', 'intersection', 'difference'):
+			tree, other = tree_of((key, key) for key in a), tree_of((key, -key) for key in b)
+			other.avl_to_array = no_dump
+			if op == 'difference':
+				tree.difference(other)
+				expect = {key: key for key in a if key not in b}
+			elif op == 'union':
+				tree.union(other, lambda val, other_val: val + other_val)
+				expect = dict((key, -key) for key in b)
+				expect.update((key, 0 if key in b else key) for key in a)
+			else:
+				tree.intersection(other, lambda val, other_val: (val, other_val))
+				expect = {key: (key, -key) for key in a if key in b}
+			assert tree.avl_to_array() == sorted(expect.items()), op
+			if expect:
+				assert tree.get_min().get_key() == min(expect) and tree.get_max().get_key() == max(expect)
+
+
+def test_small_self_keeps_its_nodes():
+	for op in ('intersection', 'difference'):
+		tree, other = tree_of((key, key) for key in range(0, 100, 2)), tree_of((key, key) for key in range(0, 1000, 3))
+		tree.enable_pool()
+		nodes = {key: tree.search(key) for key in range(0, 100, 2)}
+		getattr(tree, op)(other)
+		for key, val in tree.avl_to_array():
+			assert tree.search(key) is nodes[key]
+		assert tree.pool.released == 50 - tree.size()
@@ -0,0 +1,27 @@
+import random
+
+from ShardedAVLTree import ShardedAVLTree
+
+
+def test_count_range_matches_brute_force():
+	rnd = random.Random(7)
+	tree = ShardedAVLTree(max_shard=16)
+	keys = rnd.sample(range(300), 200)
+	for key in keys:
+		tree.insert(key, key)
+	assert len(tree.shards) > 2
+	ranges = [(rnd.randrange(-10, 310), rnd.randrange(-10, 310)) for i in range(500)]
+	ranges += [(178, 0), (241, 79), (None, 50), (250, None), (None, None)]
+	expect = [sum(1 for key in keys if (lo is None or lo <= key) and (hi is None or key <= hi))
+				for lo, hi in ranges]
+	assert [tree.count_range(lo, hi) for lo, hi in ranges] == expect
+	assert tree.count_range_many(ranges) == expect
+
+
+def test_search_many_matches_search():
+	rnd = random.Random(8)
+	tree = ShardedAVLTree(max_shard=32)
+	tree.bulk_load((key, -key) for key in rnd.sample(range(1000), 600))
+	keys = [rnd.randrange(-10, 1010) for i in range(500)]
+	expect = [None if tree.search(key) is None else tree.search(key).get_value() for key in keys]
+	assert tree.search_many(keys) == expect
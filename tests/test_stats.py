@@ -0,0 +1,28 @@
+import pickle
+
+from AVLTree import AVLTree, TreeStats
+from IntervalTree import IntervalTree
+
+
+def test_stats_keep_other_callables():
+	tree = IntervalTree(start=lambda key: key[0])
+	for i in range(50):
+		tree.insert((i, i), i + 5)
+	stats = tree.enable_stats()
+	tree.enable_stats(stats)
+	assert list(tree.stab(3)) == [((i, i), i + 5) for i in range(4)]
+	left, x, right = tree.split_key((10, 10))
+	assert x.get_key() == (10, 10) and left.size() == 10 and right.size() == 39
+	assert tree.disable_stats() is stats
+	assert 'start' in tree.__dict__ and 'end' in tree.__dict__
+
+
+def test_pickle_drops_stats():
+	tree = AVLTree()
+	tree.enable_stats(TreeStats())
+	for key in range(20):
+		tree.insert(key, key)
+	copy = pickle.loads(pickle.dumps(tree))
+	assert copy.stats is None and copy.instrumented == ()
+	assert 'insert' not in copy.__dict__
+	assert copy.avl_to_array() == tree.avl_to_array()